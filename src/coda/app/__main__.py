@@ -3,4 +3,5 @@ import uvicorn
 from .server import app
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # "auto" runs on uvloop when it is installed, asyncio otherwise
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="auto")
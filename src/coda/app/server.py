@@ -1,7 +1,7 @@
 """
 Real-time Voice Transcription Server using OpenAI Whisper
 Requirements:
-    pip install fastapi uvicorn websockets whisper numpy scipy
+    pip install fastapi uvicorn websockets whisper numpy
 
 To run:
     python server.py
@@ -10,9 +10,11 @@ To run:
 import asyncio
 import logging
 import os
-from typing import Dict
+from collections import OrderedDict, deque
+from typing import Optional
 
 import httpx
+import orjson
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse
 
@@ -21,16 +23,30 @@ from coda.dialogue import AudioProcessor
 from coda.grounding.gilda_grounder import GildaGrounder
 
 app = FastAPI()
+# If larger than 1, chunks arriving concurrently from different connections
+# are transcribed together in batches of up to this size. Batched decoding
+# has no temperature fallback, so it is opt-in
+TRANSCRIBE_BATCH_SIZE = int(os.getenv("TRANSCRIBE_BATCH_SIZE", "1"))
 transcriber = WhisperTranscriber(grounder=GildaGrounder(),
-                                 model_size="medium")
+                                 model_size="medium",
+                                 max_batch_size=TRANSCRIBE_BATCH_SIZE)
 
 # HTTP client for inference agent
 INFERENCE_URL = os.getenv("INFERENCE_URL", "http://localhost:5123")
-inference_client = httpx.AsyncClient(base_url=INFERENCE_URL, timeout=30.0)
+# Persistent pooled client shared by all connections. HTTP/2 is negotiated
+# (via TLS ALPN) when the inference URL is served over https, plain http
+# falls back to keep-alive HTTP/1.1 connections from the pool.
+inference_client = httpx.AsyncClient(
+    base_url=INFERENCE_URL,
+    timeout=30.0,
+    http2=True,
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+)
 
 # Queue management for backpressure
 MAX_PENDING_CHUNKS = 3
-pending_chunks: Dict[str, asyncio.Task] = {}
+# Pending inference tasks in submission order, oldest first
+pending_chunks: OrderedDict[str, asyncio.Task] = OrderedDict()
 
 logger = logging.getLogger(__name__)
 
@@ -38,23 +54,106 @@ here = os.path.dirname(os.path.abspath(__file__))
 templates_dir = os.path.join(here, "templates")
 
 
+async def send_json_fast(websocket: WebSocket, message: dict):
+    """Send a message as JSON text, serialized with orjson.
+
+    Raises orjson.JSONEncodeError if the message has values orjson can't
+    serialize, rather than sending their string representation.
+    """
+    data = orjson.dumps(message, option=orjson.OPT_SERIALIZE_NUMPY)
+    await websocket.send_text(data.decode())
+
+
+class WebSocketSender:
+    """Send messages on a websocket from a single writer task.
+
+    Producers queue messages without awaiting the send. The writer task
+    is woken up when messages are queued and sends all of them in order.
+    If sending fails, the writer closes the websocket and later messages
+    are dropped rather than queued with nothing left to send them.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self._messages = deque()
+        self._wakeup: Optional[asyncio.Future] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._stopped = False
+
+    def start(self):
+        """Start the writer task."""
+        self._writer = asyncio.create_task(self._run())
+
+    def send(self, message: dict):
+        """Queue a message to be sent, or drop it if the writer stopped."""
+        if self._stopped:
+            logger.debug(f"Dropped {message.get('type')} message, "
+                         f"the WebSocket writer stopped")
+            return
+        self._messages.append(message)
+        if self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                while self._messages:
+                    message = self._messages.popleft()
+                    try:
+                        await send_json_fast(self.websocket, message)
+                    except orjson.JSONEncodeError as e:
+                        # Drop the message but keep the writer running
+                        logger.error(f"Can't serialize {message.get('type')} "
+                                     f"message: {e}")
+                self._wakeup = loop.create_future()
+                await self._wakeup
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"WebSocket writer stopped: {e}")
+            self._stopped = True
+            self._messages.clear()
+            # Close the connection so that the endpoint stops receiving
+            # audio and producing messages for it
+            try:
+                await self.websocket.close()
+            except Exception:
+                pass
+
+    async def close(self, flush: bool = False):
+        """Stop the writer task, optionally sending queued messages first."""
+        self._stopped = True
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+        if flush:
+            while self._messages:
+                await send_json_fast(self.websocket, self._messages.popleft())
+        self._messages.clear()
+
+
 def render_annotations(annotations):
-    """Render annotations as a list of strings."""
+    """Render annotations as a list of dicts for the client to display.
+
+    Each dict has the annotated text ("t"), and the CURIE ("c") and name
+    ("n") of its top grounding.
+    """
     if not annotations:
         return []
-    parts = []
-    for ann in annotations:
-        term = ann.matches[0].term
-        curie = term.get_curie()
-        name = term.entry_name
-        text = ann.text
-        part = f"{text} = {curie} ({name})"
-        parts.append(part)
-    return parts
+    return [
+        {"t": ann.text,
+         "c": ann.matches[0].term.get_curie(),
+         "n": ann.matches[0].term.entry_name}
+        for ann in annotations
+    ]
 
 
 async def process_inference(chunk_id: str, timestamp: float, transcript: str,
-                           annotations: list, websocket: WebSocket):
+                           annotations: list, sender: WebSocketSender):
     """Process inference in background and send results via HTTP."""
     try:
         # Send request to inference agent
@@ -68,7 +167,7 @@ async def process_inference(chunk_id: str, timestamp: float, transcript: str,
         result = response.json()
 
         # Send inference result to client
-        await websocket.send_json({
+        sender.send({
             "type": "inference",
             **result
         })
@@ -84,29 +183,28 @@ async def process_inference(chunk_id: str, timestamp: float, transcript: str,
 
     except httpx.TimeoutException:
         logger.error(f"Inference timeout for chunk {chunk_id}")
-        await websocket.send_json({
+        sender.send({
             "type": "error",
             "chunk_id": chunk_id,
             "error": "Inference timeout"
         })
     except httpx.ConnectError:
         logger.error(f"Cannot connect to inference agent for chunk {chunk_id}")
-        await websocket.send_json({
+        sender.send({
             "type": "error",
             "chunk_id": chunk_id,
             "error": "Inference agent unavailable"
         })
     except Exception as e:
         logger.error(f"Inference error for chunk {chunk_id}: {e}", exc_info=True)
-        await websocket.send_json({
+        sender.send({
             "type": "error",
             "chunk_id": chunk_id,
             "error": str(e)
         })
     finally:
         # Clean up pending task
-        if chunk_id in pending_chunks:
-            del pending_chunks[chunk_id]
+        pending_chunks.pop(chunk_id, None)
 
 
 @app.websocket("/ws")
@@ -116,16 +214,17 @@ async def websocket_endpoint(websocket: WebSocket):
     logger.info("WebSocket connection established")
 
     processor = AudioProcessor()
+    sender = WebSocketSender(websocket)
+    sender.start()
 
     try:
         while True:
             # Backpressure: drop oldest chunk if too many pending
             if len(pending_chunks) >= MAX_PENDING_CHUNKS:
-                oldest_id = next(iter(pending_chunks))
-                pending_chunks[oldest_id].cancel()
-                del pending_chunks[oldest_id]
+                oldest_id, oldest_task = pending_chunks.popitem(last=False)
+                oldest_task.cancel()
                 logger.warning(f"Dropped chunk {oldest_id} due to backpressure")
-                await websocket.send_json({
+                sender.send({
                     "type": "warning",
                     "message": "Processing slower than audio - dropping old chunks"
                 })
@@ -148,7 +247,7 @@ async def websocket_endpoint(websocket: WebSocket):
                         annotations_rendered = render_annotations(annotations)
 
                         # Send transcript immediately
-                        await websocket.send_json({
+                        sender.send({
                             "type": "transcript",
                             "chunk_id": chunk_id,
                             "timestamp": timestamp,
@@ -160,7 +259,7 @@ async def websocket_endpoint(websocket: WebSocket):
                         # Start inference in background
                         inference_task = asyncio.create_task(
                             process_inference(chunk_id, timestamp, transcript,
-                                            annotations, websocket)
+                                            annotations, sender)
                         )
                         pending_chunks[chunk_id] = inference_task
 
@@ -171,14 +270,16 @@ async def websocket_endpoint(websocket: WebSocket):
             task.cancel()
         pending_chunks.clear()
         processor.clear_buffer()
+        await sender.close()
 
     except Exception as e:
         logger.error(f"WebSocket error: {e}", exc_info=True)
+        sender.send({
+            "type": "error",
+            "error": str(e)
+        })
         try:
-            await websocket.send_json({
-                "type": "error",
-                "error": str(e)
-            })
+            await sender.close(flush=True)
         except:
             pass
         processor.clear_buffer()
@@ -1,20 +1,20 @@
 __all__ = ["AudioProcessor", "Transcriber"]
 
-import os
+import asyncio
 import logging
-import tempfile
 import time
 import uuid
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
-import gilda
 import numpy as np
-from scipy.io import wavfile
 
 from coda.grounding import BaseGrounder
 
 logger = logging.getLogger(__name__)
 
+# Scale factor from int16 PCM samples to float32 samples in [-1, 1)
+INT16_SCALE = np.float32(1.0 / 32768.0)
+
 
 class AudioProcessor:
     def __init__(self, sample_rate=16000, chunk_duration=3):
@@ -30,7 +30,19 @@ class AudioProcessor:
         self.sample_rate = sample_rate
         self.chunk_duration = chunk_duration
         self.chunk_size = sample_rate * chunk_duration
-        self.audio_buffer = np.array([], dtype=np.int16)
+        # Keep some overlap between chunks for better continuity (0.5 seconds)
+        self.overlap_size = int(sample_rate * 0.5)
+        # Audio is written into a preallocated buffer between a read and a
+        # write index so that the streaming path doesn't allocate
+        self._capacity = self.chunk_size * 2
+        self._buffer = np.empty(self._capacity, dtype=np.int16)
+        self._read = 0
+        self._write = 0
+
+    @property
+    def num_samples(self) -> int:
+        """Number of buffered samples not yet consumed."""
+        return self._write - self._read
 
     def add_audio(self, audio_data: bytes) -> bool:
         """Add audio data to buffer
@@ -41,10 +53,33 @@ class AudioProcessor:
         """
         # Convert bytes to numpy array
         audio_array = np.frombuffer(audio_data, dtype=np.int16)
-        self.audio_buffer = np.concatenate([self.audio_buffer, audio_array])
+        size = audio_array.size
+        if self._write + size > self._capacity:
+            self._make_room(size)
+        self._buffer[self._write:self._write + size] = audio_array
+        self._write += size
 
         # Check if we have enough audio for processing
-        return len(self.audio_buffer) >= self.chunk_size
+        return self.num_samples >= self.chunk_size
+
+    def _make_room(self, size: int):
+        """Make room for `size` more samples at the end of the buffer.
+
+        Pending samples are moved to the start of the buffer, which only
+        copies the overlap and any partial chunk. The buffer is only grown
+        if the pending audio doesn't fit, i.e., if chunks are not consumed
+        as fast as audio arrives.
+        """
+        pending = self.num_samples
+        if pending + size > self._capacity:
+            self._capacity = max(2 * self._capacity, pending + size)
+            buffer = np.empty(self._capacity, dtype=np.int16)
+            buffer[:pending] = self._buffer[self._read:self._write]
+            self._buffer = buffer
+        else:
+            self._buffer[:pending] = self._buffer[self._read:self._write]
+        self._read = 0
+        self._write = pending
 
     def get_chunk(self) -> Optional[Tuple[str, float, np.ndarray]]:
         """Get a chunk of audio for processing with unique ID and timestamp.
@@ -53,53 +88,89 @@ class AudioProcessor:
         -------
         Optional[Tuple[str, float, np.ndarray]]
             Tuple of (chunk_id, timestamp, audio_data) if chunk is ready, None otherwise
-            timestamp is Unix time (seconds since epoch)
+            timestamp is Unix time (seconds since epoch), audio_data are
+            float32 samples normalized to [-1, 1)
         """
-        if len(self.audio_buffer) >= self.chunk_size:
+        if self.num_samples >= self.chunk_size:
             chunk_id = str(uuid.uuid4())
             timestamp = time.time()
-            chunk = self.audio_buffer[:self.chunk_size]
-            # Keep some overlap for better continuity (0.5 seconds)
-            overlap_size = int(self.sample_rate * 0.5)
-            self.audio_buffer = self.audio_buffer[self.chunk_size - overlap_size:]
+            # Convert to float32 in a single pass, which also copies the
+            # chunk out of the buffer that is reused for incoming audio
+            chunk = np.multiply(
+                self._buffer[self._read:self._read + self.chunk_size],
+                INT16_SCALE, dtype=np.float32
+            )
+            self._read += self.chunk_size - self.overlap_size
             return (chunk_id, timestamp, chunk)
         return None
 
     def clear_buffer(self):
         """Clear the audio buffer"""
-        self.audio_buffer = np.array([], dtype=np.int16)
+        self._read = 0
+        self._write = 0
 
 
 class Transcriber:
-    def __init__(self, grounder: BaseGrounder):
+    def __init__(self, grounder: BaseGrounder, max_batch_size: int = 1,
+                 batch_window: float = 0.02):
+        """Initialize the transcriber.
+
+        Parameters
+        ----------
+        grounder :
+            Grounder used to annotate transcripts.
+        max_batch_size :
+            Maximum number of audio chunks transcribed together. If larger
+            than 1, chunks submitted concurrently (e.g., from several
+            websocket connections) are collected and transcribed in a
+            single batch.
+        batch_window :
+            Time (seconds) to wait for more chunks after the first one
+            before transcribing a batch.
+        """
         self.grounder = grounder
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self._batch_queue = None
+        self._batch_worker = None
 
     async def transcribe_audio(self, audio_data: np.ndarray,
                                sample_rate: int = 16000):
-        try:
-            # Convert int16 to float32
-            audio_float = audio_data.astype(np.float32) / 32768.0
-
-            # Create temporary WAV file
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-                wavfile.write(tmp_file.name, sample_rate, audio_float)
-                tmp_filename = tmp_file.name
-
-            # Transcribe with Whisper
-            result = await self.transcribe_file(
-                tmp_filename,
-                language="en",  # Set to None for auto-detection
-                fp16=False,
-                verbose=False
-            )
+        """Transcribe and annotate a chunk of audio.
+
+        Parameters
+        ----------
+        audio_data :
+            Float32 audio samples normalized to [-1, 1), as returned by
+            AudioProcessor.get_chunk.
+        sample_rate :
+            Sample rate of the audio.
 
-            # Clean up temp file
-            os.unlink(tmp_filename)
+        Returns
+        -------
+        tuple
+            The transcript text and its annotations.
+        """
+        try:
+            # Transcribe the in-memory samples directly, avoiding a
+            # round-trip through a temporary WAV file and ffmpeg
+            if self.max_batch_size > 1:
+                result = await self._submit_for_batch(audio_data)
+            else:
+                result = await self.transcribe_array(
+                    audio_data,
+                    language="en",  # Set to None for auto-detection
+                    verbose=False
+                )
 
             # Filter segments based on no_speech_prob to avoid hallucinations
             # during silence (e.g., "thank you for watching")
             text = self._filter_segments(result)
-            annotations = self.grounder.annotate(text)
+            # Grounding is CPU-bound, run it in the thread pool so that it
+            # doesn't block websocket I/O on the event loop
+            annotations = await asyncio.get_running_loop().run_in_executor(
+                None, self.grounder.annotate, text
+            )
 
             return text, annotations
 
@@ -110,10 +181,108 @@ class Transcriber:
             traceback.print_exc()
             return "", {}
 
-    async def transcribe_file(self, file_path: str, language: str = "en",
-                              fp16: bool = False, verbose: bool = False):
+    async def transcribe_array(self, audio: np.ndarray, language: str = "en",
+                               fp16: Optional[bool] = None,
+                               verbose: bool = False):
+        """Transcribe audio samples held in memory.
+
+        Parameters
+        ----------
+        audio :
+            Mono float32 audio samples in [-1, 1] at 16 kHz.
+        language :
+            Language of the audio, None for auto-detection.
+        fp16 :
+            Whether to run inference in half precision. If None, the
+            backend chooses based on the device it runs on.
+        verbose :
+            Whether to print progress of the transcription backend.
+
+        Returns
+        -------
+        dict
+            The result dictionary from the transcription backend
+        """
         raise NotImplementedError
 
+    async def transcribe_batch(self, audios: List[np.ndarray],
+                               language: str = "en",
+                               fp16: Optional[bool] = None,
+                               verbose: bool = False) -> List[dict]:
+        """Transcribe several chunks of audio samples.
+
+        Subclasses may override this to run the chunks through the
+        backend as a single batch, by default they are transcribed
+        one after the other.
+
+        Parameters
+        ----------
+        audios :
+            List of mono float32 audio samples in [-1, 1] at 16 kHz.
+        language :
+            Language of the audio, None for auto-detection.
+        fp16 :
+            Whether to run inference in half precision. If None, the
+            backend chooses based on the device it runs on.
+        verbose :
+            Whether to print progress of the transcription backend.
+
+        Returns
+        -------
+        list of dict
+            The result dictionaries from the transcription backend, in the
+            order of the input chunks
+        """
+        return [await self.transcribe_array(audio, language=language,
+                                            fp16=fp16, verbose=verbose)
+                for audio in audios]
+
+    async def _submit_for_batch(self, audio: np.ndarray) -> dict:
+        """Queue audio for batched transcription and wait for the result."""
+        loop = asyncio.get_running_loop()
+        if self._batch_worker is None or self._batch_worker.done() \
+                or self._batch_worker.get_loop() is not loop:
+            self._batch_queue = asyncio.Queue()
+            self._batch_worker = loop.create_task(self._run_batches())
+        future = loop.create_future()
+        self._batch_queue.put_nowait((audio, future))
+        return await future
+
+    async def _run_batches(self):
+        """Collect queued audio into batches and transcribe them."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._batch_queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(
+                        self._batch_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Skip chunks whose requester has been cancelled meanwhile
+            batch = [(audio, future) for audio, future in batch
+                     if not future.done()]
+            if not batch:
+                continue
+            try:
+                results = await self.transcribe_batch(
+                    [audio for audio, _ in batch],
+                    language="en",
+                    verbose=False
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+
     def _filter_segments(self, result: dict) -> str:
         """Extract text from transcription result.
 
@@ -1,7 +1,12 @@
 import asyncio
 import logging
+from typing import List, Optional
 
+import numpy as np
+import torch
+import torch.nn.functional as F
 import whisper
+from whisper.decoding import DecodingTask
 
 from . import Transcriber
 from coda.grounding import BaseGrounder
@@ -14,42 +19,176 @@ DEFAULT_MODEL_SIZE = "small"
 # Segments with no_speech_prob above this value are considered silence.
 DEFAULT_NO_SPEECH_THRESHOLD = 0.6
 
+# Supported values for the quantize argument of WhisperTranscriber
+QUANTIZATION_MODES = {"int8"}
+
+# Duration of the silent audio used to warm up the model (seconds)
+WARMUP_DURATION = 3
+
 logger = logging.getLogger(__name__)
 
 
 class WhisperTranscriber(Transcriber):
     """Transcriber implementation using OpenAI's Whisper model."""
     def __init__(self, grounder: BaseGrounder, model_size: str = DEFAULT_MODEL_SIZE,
-                 no_speech_threshold: float = None):
-        super().__init__(grounder=grounder)
+                 no_speech_threshold: float = None, device: Optional[str] = None,
+                 quantize: Optional[str] = None, compile_model: bool = False,
+                 warmup: bool = True, max_batch_size: int = 1,
+                 batch_window: float = 0.02, trim_encoder: bool = False):
+        """Initialize the Whisper transcriber.
+
+        Parameters
+        ----------
+        grounder :
+            Grounder used to annotate transcripts.
+        model_size :
+            Name of the Whisper model to load, e.g., "small" or "medium".
+        no_speech_threshold :
+            Segments with no_speech_prob above this value are dropped.
+        device :
+            Torch device to run the model on. Defaults to "cuda" if
+            available, otherwise "cpu".
+        quantize :
+            If "int8", apply dynamic int8 quantization to the linear layers
+            of the model. Only supported on CPU.
+        compile_model :
+            If True, compile the encoder and decoder with torch.compile
+            (requires torch>=2.0).
+        warmup :
+            If True, transcribe a short silent clip at construction time so
+            that one-time costs (compilation, kernel selection, memory
+            allocation) are paid at startup rather than on the first chunk.
+        max_batch_size :
+            Maximum number of concurrently submitted chunks decoded
+            together in a single batch.
+        batch_window :
+            Time (seconds) to wait for more chunks before decoding a batch.
+        trim_encoder :
+            If True, only encode the mel frames covering the actual audio
+            instead of Whisper's full 30 second window, e.g., 300 frames for
+            a 3 second chunk, which cuts encoder compute accordingly. Whisper
+            is trained on full windows, so this can affect accuracy and
+            should be validated for the model in use.
+        """
+        super().__init__(grounder=grounder, max_batch_size=max_batch_size,
+                         batch_window=batch_window)
+        self.trim_encoder = trim_encoder
         self.no_speech_threshold = (
             no_speech_threshold if no_speech_threshold is not None
             else DEFAULT_NO_SPEECH_THRESHOLD
         )
-        logger.info(f"Loading Whisper model: {model_size}")
-        self.model = whisper.load_model(model_size)
+        if quantize is not None and quantize not in QUANTIZATION_MODES:
+            raise ValueError(f"Unsupported quantization mode: {quantize}")
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        logger.info(f"Loading Whisper model: {model_size} on {self.device}")
+        self.model = whisper.load_model(model_size, device=self.device)
+        if quantize == "int8":
+            if self.device != "cpu":
+                logger.warning("int8 quantization is only supported on CPU, "
+                               "skipping quantization")
+            else:
+                logger.info("Applying dynamic int8 quantization")
+                self.model = _quantize_dynamic_int8(self.model)
+        # Half precision is only beneficial (and supported) on GPU
+        self.fp16 = self.device != "cpu"
+        if compile_model:
+            self._compile()
         logger.info("Whisper model loaded successfully")
+        if warmup:
+            self.warmup()
+
+    def _compile(self):
+        """Compile the encoder and decoder of the model with torch.compile."""
+        if not hasattr(torch, "compile"):
+            logger.warning("torch.compile requires torch>=2.0, skipping")
+            return
+        mode = "reduce-overhead" if self.device != "cpu" else None
+        try:
+            self.model.encoder = torch.compile(self.model.encoder, mode=mode)
+            self.model.decoder = torch.compile(self.model.decoder, mode=mode)
+        except Exception as e:
+            logger.warning(f"Could not compile Whisper model: {e}")
+
+    def warmup(self):
+        """Run the model once on silence to pay one-time startup costs."""
+        logger.info("Warming up Whisper model")
+        silence = np.zeros(whisper.audio.SAMPLE_RATE * WARMUP_DURATION,
+                           dtype=np.float32)
+        self._sync_transcribe(silence, "en", self.fp16, None)
 
-    async def transcribe_file(self, file_path: str, language: str = "en",
-                              fp16: bool = False, verbose: bool = False):
-        """Transcribe file asynchronously using thread pool."""
+    async def transcribe_array(self, audio: np.ndarray, language: str = "en",
+                               fp16: Optional[bool] = None,
+                               verbose: bool = False):
+        """Transcribe audio samples asynchronously using thread pool."""
+        if fp16 is None:
+            fp16 = self.fp16
         loop = asyncio.get_running_loop()
         return await loop.run_in_executor(
             None,
             self._sync_transcribe,
-            file_path, language, fp16, verbose
+            audio, language, fp16, verbose
         )
 
-    def _sync_transcribe(self, file_path: str, language: str,
+    def _sync_transcribe(self, audio: np.ndarray, language: str,
                         fp16: bool, verbose: bool):
         """Synchronous transcription method."""
+        if self.trim_encoder:
+            return self._sync_transcribe_batch([audio], language, fp16)[0]
         return self.model.transcribe(
-            file_path,
+            audio,
             language=language,
             fp16=fp16,
             verbose=verbose
         )
 
+    async def transcribe_batch(self, audios: List[np.ndarray],
+                               language: str = "en",
+                               fp16: Optional[bool] = None,
+                               verbose: bool = False) -> List[dict]:
+        """Transcribe a batch of audio chunks asynchronously using thread pool."""
+        if fp16 is None:
+            fp16 = self.fp16
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None,
+            self._sync_transcribe_batch,
+            audios, language, fp16
+        )
+
+    def _sync_transcribe_batch(self, audios: List[np.ndarray], language: str,
+                               fp16: bool) -> List[dict]:
+        """Decode a batch of chunks with a single encoder and decoder pass.
+
+        Each chunk is padded to Whisper's 30 second window, so chunks of
+        a few seconds are decoded in one window like in transcribe(),
+        but without its temperature fallback. If trim_encoder is set, only
+        the frames covering the longest chunk are encoded.
+        """
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(audio),
+                                        n_mels=self.model.dims.n_mels)
+            for audio in audios
+        ]).to(self.model.device)
+        options = whisper.DecodingOptions(language=language, fp16=fp16,
+                                          without_timestamps=True)
+        if self.trim_encoder:
+            n_frames = _num_frames(max(len(audio) for audio in audios))
+            with torch.no_grad():
+                results = _TrimmedDecodingTask(self.model, options,
+                                               n_frames).run(mel)
+        else:
+            results = whisper.decode(self.model, mel, options)
+        # Return results in the same structure as transcribe() so that
+        # segments are filtered the same way
+        return [
+            {
+                "text": result.text,
+                "segments": [{"text": result.text,
+                              "no_speech_prob": result.no_speech_prob}],
+            }
+            for result in results
+        ]
+
     def _filter_segments(self, result: dict) -> str:
         """Filter transcription segments based on no_speech_prob.
 
@@ -67,19 +206,94 @@ class WhisperTranscriber(Transcriber):
         str
             Filtered transcription text with silent segments removed
         """
-        segments = result.get("segments", [])
-        if not segments:
-            return result.get("text", "").strip()
-
-        filtered_texts = []
-        for segment in segments:
-            no_speech_prob = segment.get("no_speech_prob", 0.0)
-            if no_speech_prob < self.no_speech_threshold:
-                filtered_texts.append(segment.get("text", ""))
-            else:
-                logger.debug(
-                    f"Filtered silent segment (no_speech_prob={no_speech_prob:.2f}): "
-                    f"{segment.get('text', '')!r}"
-                )
+        return filter_silent_segments(result, self.no_speech_threshold)
+
+
+def filter_silent_segments(result: dict, no_speech_threshold: float) -> str:
+    """Return the text of the segments of a result that aren't silent.
+
+    Parameters
+    ----------
+    result :
+        Transcription result with a "segments" list, each segment with
+        "text" and "no_speech_prob", as returned by Whisper's transcribe().
+    no_speech_threshold :
+        Segments with no_speech_prob above this value are dropped.
+
+    Returns
+    -------
+    str
+        Text of the remaining segments, or the text of the result if it
+        has no segments.
+    """
+    segments = result.get("segments", [])
+    if not segments:
+        return result.get("text", "").strip()
+
+    filtered_texts = []
+    for segment in segments:
+        no_speech_prob = segment.get("no_speech_prob", 0.0)
+        if no_speech_prob < no_speech_threshold:
+            filtered_texts.append(segment.get("text", ""))
+        else:
+            logger.debug(
+                f"Filtered silent segment (no_speech_prob={no_speech_prob:.2f}): "
+                f"{segment.get('text', '')!r}"
+            )
+
+    return "".join(filtered_texts).strip()
+
+
+class _TrimmedDecodingTask(DecodingTask):
+    """Decoding task that encodes only the first n_frames mel frames."""
+    def __init__(self, model: whisper.Whisper, options: whisper.DecodingOptions,
+                 n_frames: int):
+        super().__init__(model, options)
+        self.n_frames = n_frames
+
+    def _get_audio_features(self, mel: torch.Tensor) -> torch.Tensor:
+        if self.options.fp16:
+            mel = mel.half()
+        return _encode_trimmed(self.model.encoder, mel[..., :self.n_frames])
+
+
+def _num_frames(num_samples: int) -> int:
+    """Return the number of mel frames to encode for an audio length.
+
+    The encoder's convolutions halve the number of frames, so this is
+    rounded up to an even number, and capped at the full 30 second window.
+    """
+    n_frames = -(-num_samples // whisper.audio.HOP_LENGTH)
+    n_frames += n_frames % 2
+    return min(n_frames, whisper.audio.N_FRAMES)
+
+
+def _encode_trimmed(encoder, mel: torch.Tensor) -> torch.Tensor:
+    """Run Whisper's audio encoder on fewer frames than a full window.
+
+    This is the encoder's forward pass with the positional embedding sliced
+    to the number of frames, instead of asserting a full 30 second input.
+    """
+    x = F.gelu(encoder.conv1(mel))
+    x = F.gelu(encoder.conv2(x))
+    x = x.permute(0, 2, 1)
+    x = (x + encoder.positional_embedding[:x.shape[1]]).to(x.dtype)
+    for block in encoder.blocks:
+        x = block(x)
+    return encoder.ln_post(x)
+
+
+def _quantize_dynamic_int8(model: whisper.Whisper) -> whisper.Whisper:
+    """Quantize the linear layers of a Whisper model to int8 weights.
 
-        return "".join(filtered_texts).strip()
+    Whisper uses its own Linear subclass (which casts weights to the input
+    dtype) that torch's dynamic quantization does not recognize, so these
+    layers are first turned back into plain torch Linear layers. This is
+    equivalent for float32 inputs on CPU.
+    """
+    for module in model.modules():
+        if isinstance(module, whisper.model.Linear):
+            module.__class__ = torch.nn.Linear
+    return torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    )
@@ -0,0 +1,171 @@
+"""Whisper transcription using ONNX Runtime for CPU inference.
+
+The model is expected to be exported with ONNX Runtime's Whisper conversion
+tool, which fuses the encoder, the decoder (with key/value cache reuse) and
+beam search into a single graph, for instance:
+
+    python -m onnxruntime.transformers.models.whisper.convert_to_onnx \\
+        -m openai/whisper-small --output whisper-small-onnx \\
+        --precision int8 --quantize_embedding_layer \\
+        --use_external_data_format --output_no_speech_probs
+
+The resulting ``*_beamsearch.onnx`` file is passed as `model_path`. With
+``--output_no_speech_probs``, the model also returns the probability that
+a chunk contains no speech, which is used to drop silent chunks like
+WhisperTranscriber does, as Whisper tends to hallucinate text on silence.
+"""
+
+__all__ = ["OnnxWhisperTranscriber"]
+
+import asyncio
+import logging
+from typing import List, Optional
+
+import numpy as np
+import onnxruntime as ort
+import whisper
+
+from . import Transcriber
+from .whisper import DEFAULT_NO_SPEECH_THRESHOLD, filter_silent_segments
+from coda.grounding import BaseGrounder
+
+# Maximum number of tokens generated per chunk. A few seconds of speech
+# rarely exceeds a few dozen tokens.
+DEFAULT_MAX_LENGTH = 128
+
+logger = logging.getLogger(__name__)
+
+# Numpy types of the tensor types used by the exported model inputs
+_ONNX_DTYPES = {
+    "tensor(int32)": np.int32,
+    "tensor(int64)": np.int64,
+    "tensor(float)": np.float32,
+    "tensor(float16)": np.float16,
+}
+
+
+class OnnxWhisperTranscriber(Transcriber):
+    """Transcriber implementation running Whisper with ONNX Runtime."""
+    def __init__(self, grounder: BaseGrounder, model_path: str,
+                 multilingual: bool = True, n_mels: int = 80,
+                 num_beams: int = 1, max_length: int = DEFAULT_MAX_LENGTH,
+                 providers: Optional[List[str]] = None,
+                 num_threads: Optional[int] = None,
+                 no_speech_threshold: Optional[float] = None):
+        """Initialize the ONNX Runtime Whisper transcriber.
+
+        Parameters
+        ----------
+        grounder :
+            Grounder used to annotate transcripts.
+        model_path :
+            Path to the exported Whisper beam search ONNX model.
+        multilingual :
+            Whether the exported model is multilingual (i.e., not an
+            English-only ".en" model). Determines the tokenizer.
+        n_mels :
+            Number of mel frequency bins expected by the model (128 for
+            large-v3, 80 otherwise).
+        num_beams :
+            Beam size used for decoding, 1 corresponds to greedy decoding.
+        max_length :
+            Maximum number of tokens to generate per chunk.
+        providers :
+            ONNX Runtime execution providers. Defaults to the CPU provider.
+        num_threads :
+            Number of intra-op threads. Defaults to ONNX Runtime's choice.
+        no_speech_threshold :
+            Chunks with a no speech probability above this value are
+            dropped. Requires a model exported with
+            ``--output_no_speech_probs``.
+        """
+        super().__init__(grounder=grounder)
+        self.multilingual = multilingual
+        self.n_mels = n_mels
+        self.num_beams = num_beams
+        self.max_length = max_length
+        self.no_speech_threshold = (
+            no_speech_threshold if no_speech_threshold is not None
+            else DEFAULT_NO_SPEECH_THRESHOLD
+        )
+
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = (
+            ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        if num_threads is not None:
+            sess_options.intra_op_num_threads = num_threads
+        logger.info(f"Loading ONNX Whisper model: {model_path}")
+        self.session = ort.InferenceSession(
+            model_path,
+            sess_options=sess_options,
+            providers=providers or ["CPUExecutionProvider"],
+        )
+        self._input_types = {
+            inp.name: _ONNX_DTYPES.get(inp.type, np.float32)
+            for inp in self.session.get_inputs()
+        }
+        self._outputs = ["sequences"]
+        if any(out.name == "no_speech_probs"
+               for out in self.session.get_outputs()):
+            self._outputs.append("no_speech_probs")
+        else:
+            logger.warning("ONNX Whisper model has no no_speech_probs output, "
+                           "silent chunks won't be filtered. Export it with "
+                           "--output_no_speech_probs to filter them.")
+        logger.info("ONNX Whisper model loaded successfully")
+
+    async def transcribe_array(self, audio: np.ndarray, language: str = "en",
+                               fp16: Optional[bool] = None,
+                               verbose: bool = False):
+        """Transcribe audio samples asynchronously using thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None,
+            self._sync_transcribe,
+            audio, language
+        )
+
+    def _sync_transcribe(self, audio: np.ndarray, language: str):
+        """Synchronous transcription method."""
+        tokenizer = whisper.tokenizer.get_tokenizer(
+            self.multilingual, language=language, task="transcribe"
+        )
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio),
+                                          n_mels=self.n_mels)
+        inputs = {
+            "input_features": mel.numpy()[np.newaxis],
+            "max_length": [self.max_length],
+            "min_length": [0],
+            "num_beams": [self.num_beams],
+            "num_return_sequences": [1],
+            "length_penalty": [1.0],
+            "repetition_penalty": [1.0],
+            # Force the language and task instead of detecting them
+            "decoder_input_ids": [list(tokenizer.sot_sequence_including_notimestamps)],
+        }
+        feeds = {
+            name: np.asarray(inputs[name], dtype=dtype)
+            for name, dtype in self._input_types.items()
+            if name in inputs
+        }
+        outputs = self.session.run(self._outputs, feeds)
+        sequences = outputs[0]
+        # Drop the special tokens (start of transcript, language, task,
+        # end of text), all of which come after the text tokens in the
+        # vocabulary
+        tokens = [int(t) for t in sequences[0, 0] if t < tokenizer.eot]
+        text = tokenizer.decode(tokens)
+        if len(outputs) == 1:
+            return {"text": text}
+        # Return results in the same structure as transcribe() so that
+        # silent chunks are filtered the same way
+        return {
+            "text": text,
+            "segments": [{"text": text,
+                          "no_speech_prob": float(outputs[1][0])}],
+        }
+
+    def _filter_segments(self, result: dict) -> str:
+        """Filter out chunks whose no speech probability is too high."""
+        return filter_silent_segments(result, self.no_speech_threshold)
@@ -1,11 +1,32 @@
+from functools import lru_cache
+
 import gilda
 
 from . import BaseGrounder
 
+# Number of distinct texts whose grounding and annotation results are cached
+DEFAULT_CACHE_SIZE = 4096
+
 
 class GildaGrounder(BaseGrounder):
+    def __init__(self, cache_size: int = DEFAULT_CACHE_SIZE):
+        """Initialize the Gilda grounder.
+
+        Parameters
+        ----------
+        cache_size :
+            Maximum number of texts for which results of ground and annotate
+            are cached. Consecutive audio chunks overlap and the same terms
+            recur throughout a conversation, so repeated texts are served
+            without walking Gilda's term index again. Set to 0 to disable
+            caching.
+        """
+        self._ground = lru_cache(maxsize=cache_size)(gilda.ground)
+        self._annotate = lru_cache(maxsize=cache_size)(gilda.annotate)
+
     def ground(self, text: str) -> list:
-        return gilda.ground(text)
+        # Return a copy so callers can't modify the cached list
+        return list(self._ground(text))
 
     def annotate(self, text: str) -> list:
-        return gilda.annotate(text)
\ No newline at end of file
+        return list(self._annotate(text))
@@ -5,9 +5,15 @@ Finds character spans of evidence strings in the original clinical text.
 """
 
 import re
+from functools import lru_cache
 from typing import Dict, Any, List, Optional, Tuple
 from difflib import SequenceMatcher
 
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:
+    process = None
+
 
 def _similarity_ratio(s1: str, s2: str) -> float:
     """Calculate similarity ratio between two strings using built-in difflib.
@@ -27,6 +33,132 @@ def _similarity_ratio(s1: str, s2: str) -> float:
     return SequenceMatcher(None, s1, s2).ratio()
 
 
+@lru_cache(maxsize=8)
+def _word_spans(text: str) -> List[Tuple[int, int]]:
+    """Return the start and end character positions of words in text."""
+    return [(m.start(), m.end()) for m in re.finditer(r'\S+', text)]
+
+
+@lru_cache(maxsize=32)
+def _text_windows(
+    text: str,
+    window_size: int,
+    case_sensitive: bool
+) -> Tuple[List[Tuple[int, int]], List[str]]:
+    """Return all windows of consecutive words of a given size in text.
+
+    The windows are cached since the same clinical text is searched for
+    the evidence of every disease extracted from it.
+
+    Returns
+    -------
+    tuple of list
+        The (start, end) character span of each window in the original
+        text, and the corresponding (normalized) window texts.
+    """
+    words = _word_spans(text)
+    spans = [(words[i][0], words[i + window_size - 1][1])
+             for i in range(len(words) - window_size + 1)]
+    # Extract actual text from original (preserves exact spacing)
+    windows = [text[start:end] for start, end in spans]
+    if not case_sensitive:
+        windows = [window.lower() for window in windows]
+    return spans, windows
+
+
+def _best_window_match(
+    evidence: str,
+    windows: List[str],
+    min_similarity: float
+) -> Optional[Tuple[int, float]]:
+    """Find the window most similar to an evidence string.
+
+    Uses RapidFuzz's C++ implementation of the normalized Indel similarity
+    if available, otherwise difflib's SequenceMatcher ratio.
+
+    Parameters
+    ----------
+    evidence : str
+        Normalized evidence string.
+    windows : list of str
+        Normalized candidate windows of the clinical text.
+    min_similarity : float
+        Minimum similarity threshold (0.0 to 1.0).
+
+    Returns
+    -------
+    tuple of (int, float) or None
+        Index of the first best matching window and its similarity, or None
+        if no window has a positive similarity of at least min_similarity.
+    """
+    if process is not None:
+        match = process.extractOne(
+            evidence,
+            windows,
+            scorer=fuzz.ratio,
+            score_cutoff=min_similarity * 100
+        )
+        if match is None or match[1] <= 0:
+            return None
+        _, score, index = match
+        return index, score / 100
+
+    # The similarity of strings of lengths m and n is at most
+    # 2 * min(m, n) / (m + n), so windows whose length alone rules out
+    # beating the best match so far are skipped without comparing them.
+    # RapidFuzz applies the same bound internally through score_cutoff.
+    best = None
+    best_similarity = 0.0
+    evidence_length = len(evidence)
+    for index, window in enumerate(windows):
+        window_length = len(window)
+        bound = (2 * min(evidence_length, window_length)
+                 / (evidence_length + window_length))
+        if bound < min_similarity or bound <= best_similarity:
+            continue
+        similarity = _similarity_ratio(evidence, window)
+        if similarity > best_similarity and similarity >= min_similarity:
+            best_similarity = similarity
+            best = (index, similarity)
+    return best
+
+
+@lru_cache(maxsize=1024)
+def _fuzzy_match(
+    clinical_text: str,
+    evidence_normalized: str,
+    min_similarity: float,
+    case_sensitive: bool
+) -> Optional[Tuple[int, int, float]]:
+    """Find the word window of the text best matching an evidence string.
+
+    Results are cached since the same evidence is often cited for several
+    diseases extracted from a clinical text.
+
+    Returns
+    -------
+    tuple of (int, int, float) or None
+        The start and end character positions of the best matching window
+        and its similarity, or None if no window matches.
+    """
+    word_count = len(_word_spans(clinical_text))
+    # Search with different window sizes
+    evidence_word_count = len(evidence_normalized.split())
+    spans = []
+    windows = []
+    for window_size in range(evidence_word_count, min(evidence_word_count + 5, word_count + 1)):
+        size_spans, size_windows = _text_windows(clinical_text, window_size,
+                                                 case_sensitive)
+        spans += size_spans
+        windows += size_windows
+
+    match = _best_window_match(evidence_normalized, windows, min_similarity)
+    if match is None:
+        return None
+    index, similarity = match
+    return spans[index] + (similarity,)
+
+
 def find_evidence_spans(
     clinical_text: str,
     evidence_strings: List[str],
@@ -58,6 +190,9 @@ def find_evidence_spans(
     # Normalize text for matching
     text_to_search = clinical_text if case_sensitive else clinical_text.lower()
 
+    # Word boundaries don't depend on the evidence, find them once
+    word_list = _word_spans(clinical_text)
+
     annotated_evidence = []
 
     for evidence in evidence_strings:
@@ -88,9 +223,6 @@ def find_evidence_spans(
 
         # If no exact match, try fuzzy matching
         # Use sliding window approach on original text to preserve exact character positions
-        words = re.finditer(r'\S+', clinical_text)  # Find word boundaries with positions
-        word_list = [(m.group(), m.start(), m.end()) for m in words]
-
         if not word_list:
             annotated_evidence.append({
                 'text': evidence_clean,
@@ -103,33 +235,17 @@ def find_evidence_spans(
 
         # Try to find best match using sliding window
         best_match = None
-        best_similarity = 0.0
-
-        # Search with different window sizes
-        evidence_word_count = len(evidence_normalized.split())
-        for window_size in range(evidence_word_count, min(evidence_word_count + 5, len(word_list) + 1)):
-            for i in range(len(word_list) - window_size + 1):
-                # Get window words and their positions
-                window_words = word_list[i:i+window_size]
-                window_start_char = window_words[0][1]  # Start of first word
-                window_end_char = window_words[-1][2]   # End of last word
-
-                # Extract actual text from original (preserves exact spacing)
-                window_text = clinical_text[window_start_char:window_end_char]
-                window_normalized = window_text if case_sensitive else window_text.lower()
-
-                # Calculate similarity
-                similarity = _similarity_ratio(evidence_normalized, window_normalized)
-
-                if similarity > best_similarity and similarity >= min_similarity:
-                    best_similarity = similarity
-                    best_match = {
-                        'text': window_text,
-                        'start': window_start_char,
-                        'end': window_end_char,
-                        'similarity': similarity,
-                        'match_type': 'fuzzy'
-                    }
+        match = _fuzzy_match(clinical_text, evidence_normalized,
+                             min_similarity, case_sensitive)
+        if match is not None:
+            window_start_char, window_end_char, similarity = match
+            best_match = {
+                'text': clinical_text[window_start_char:window_end_char],
+                'start': window_start_char,
+                'end': window_end_char,
+                'similarity': similarity,
+                'match_type': 'fuzzy'
+            }
 
         if best_match:
             annotated_evidence.append(best_match)
@@ -0,0 +1,170 @@
+"""
+Helpers for running requests through the OpenAI Batch API.
+
+Batch requests are processed asynchronously within a completion window at a
+lower cost than synchronous requests, and they don't count against the
+synchronous rate limits, which suits bulk coding jobs.
+"""
+
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import orjson
+from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+
+# Endpoint the batched requests are sent to, the same one used by
+# the synchronous responses.create calls
+BATCH_ENDPOINT = "/v1/responses"
+
+# Time within which OpenAI processes a batch
+BATCH_COMPLETION_WINDOW = "24h"
+
+# Statuses after which a batch is not processed any further
+BATCH_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def submit_batch(client: OpenAI, requests: Dict[str, Dict[str, Any]]) -> str:
+    """Upload requests as a JSONL file and create a batch for them.
+
+    Parameters
+    ----------
+    client : OpenAI
+        OpenAI client.
+    requests : dict
+        Mapping from a custom ID, used to match the outputs to the requests,
+        to the arguments of a responses.create call.
+
+    Returns
+    -------
+    str
+        ID of the created batch.
+    """
+    if not requests:
+        raise ValueError("Can't submit a batch without requests.")
+    lines = [
+        orjson.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": body,
+        })
+        for custom_id, body in requests.items()
+    ]
+    batch_file = client.files.create(
+        file=("batch.jsonl", b"\n".join(lines)),
+        purpose="batch"
+    )
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=BATCH_COMPLETION_WINDOW
+    )
+    logger.info(f"Submitted batch {batch.id} with {len(requests)} request(s)")
+    return batch.id
+
+
+def wait_for_batch(
+    client: OpenAI,
+    batch_id: str,
+    poll_interval: float = 60.0,
+    timeout: Optional[float] = None
+):
+    """Poll a batch until it is no longer being processed.
+
+    Parameters
+    ----------
+    client : OpenAI
+        OpenAI client.
+    batch_id : str
+        ID of the batch.
+    poll_interval : float
+        Time (seconds) between status checks. Defaults to 60.
+    timeout : float, optional
+        Maximum time (seconds) to wait. Defaults to waiting until the
+        batch completion window has passed.
+
+    Returns
+    -------
+    openai.types.Batch
+        The completed batch.
+
+    Raises
+    ------
+    RuntimeError
+        If the batch failed, expired or was cancelled.
+    TimeoutError
+        If the batch didn't finish within the timeout.
+    """
+    start = time.time()
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in BATCH_FINAL_STATUSES:
+            break
+        if timeout is not None and time.time() - start > timeout:
+            raise TimeoutError(
+                f"Batch {batch_id} did not finish within {timeout}s "
+                f"(status: {batch.status})"
+            )
+        logger.debug(f"Batch {batch_id} is {batch.status}, waiting")
+        time.sleep(poll_interval)
+
+    if batch.status != "completed":
+        raise RuntimeError(f"Batch {batch_id} {batch.status}")
+    return batch
+
+
+def get_batch_output_texts(client: OpenAI, batch) -> Dict[str, str]:
+    """Download the output text of each successful request of a batch.
+
+    Parameters
+    ----------
+    client : OpenAI
+        OpenAI client.
+    batch : openai.types.Batch
+        The completed batch.
+
+    Returns
+    -------
+    dict
+        Mapping from the custom ID of each successful request to its
+        output text. Failed requests are logged and left out.
+    """
+    output_texts = {}
+    if batch.output_file_id:
+        content = client.files.content(batch.output_file_id).text
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            record = orjson.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") != 200:
+                logger.warning(
+                    f"Batch request {record.get('custom_id')} failed: "
+                    f"{record.get('error') or response.get('body')}"
+                )
+                continue
+            output_texts[record["custom_id"]] = _output_text(response["body"])
+    if batch.error_file_id:
+        logger.warning(
+            f"Some requests of batch {batch.id} failed, see file "
+            f"{batch.error_file_id}"
+        )
+    return output_texts
+
+
+def _output_text(body: Dict[str, Any]) -> str:
+    """Return the output text of a raw responses.create response body.
+
+    This is what the output_text property of the client's Response
+    objects returns, which raw batch outputs don't have.
+    """
+    return "".join(
+        content.get("text", "")
+        for item in body.get("output", [])
+        if item.get("type") == "message"
+        for content in item.get("content", [])
+        if content.get("type") == "output_text"
+    )
@@ -0,0 +1,117 @@
+"""
+Persistent cache of LLM responses.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from coda import CODA_BASE
+
+# Default directory of the response cache, under the coda pystow module
+DEFAULT_CACHE_NAME = "llm_cache"
+
+# Default number of responses kept by MemoryResponseCache
+DEFAULT_MEMORY_CACHE_SIZE = 4096
+
+
+class ResponseCache:
+    """
+    On-disk cache of LLM response texts keyed by their request.
+
+    Keys are the SHA-256 hash of the full request (model, prompts and
+    output schema), so a change to any of them results in a cache miss.
+    The cache persists across runs and can be shared by several
+    processes.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Union[str, Path]] = None,
+        size_limit: int = 2 ** 30
+    ):
+        """Initialize the response cache.
+
+        Parameters
+        ----------
+        directory : str or Path, optional
+            Directory of the cache. Defaults to "llm_cache" in the coda
+            data directory.
+        size_limit : int
+            Maximum size of the cache in bytes, least recently stored
+            responses are evicted beyond it. Defaults to 1 GiB.
+        """
+        import diskcache
+
+        if directory is None:
+            directory = CODA_BASE.join(DEFAULT_CACHE_NAME)
+        self.directory = Path(directory)
+        self._cache = diskcache.Cache(str(self.directory),
+                                      size_limit=size_limit)
+
+    def get(self, request: Dict[str, Any]) -> Optional[str]:
+        """Return the cached response text of a request, if any."""
+        return self._cache.get(_request_key(request))
+
+    def set(self, request: Dict[str, Any], output_text: str):
+        """Store the response text of a request."""
+        self._cache.set(_request_key(request), output_text)
+
+    def clear(self):
+        """Remove all cached responses."""
+        self._cache.clear()
+
+
+class MemoryResponseCache:
+    """
+    In-process cache of LLM response texts keyed by their request.
+
+    A drop-in alternative to ResponseCache that needs no extra dependency
+    and doesn't touch the disk, for long-running processes such as
+    servers. Responses are lost when the process exits, and the least
+    recently used ones are evicted beyond maxsize.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MEMORY_CACHE_SIZE):
+        """Initialize the response cache.
+
+        Parameters
+        ----------
+        maxsize : int
+            Maximum number of cached responses. Defaults to 4096.
+        """
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, request: Dict[str, Any]) -> Optional[str]:
+        """Return the cached response text of a request, if any."""
+        key = _request_key(request)
+        with self._lock:
+            output_text = self._cache.get(key)
+            if output_text is not None:
+                self._cache.move_to_end(key)
+            return output_text
+
+    def set(self, request: Dict[str, Any], output_text: str):
+        """Store the response text of a request."""
+        key = _request_key(request)
+        with self._lock:
+            self._cache[key] = output_text
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def clear(self):
+        """Remove all cached responses."""
+        with self._lock:
+            self._cache.clear()
+
+
+def _request_key(request: Dict[str, Any]) -> str:
+    """Return the cache key of the arguments of a responses.create call."""
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
@@ -0,0 +1,90 @@
+"""
+OpenAI clients shared by the LLM components of the pipeline.
+"""
+
+import asyncio
+import contextlib
+import threading
+
+from openai import AsyncOpenAI, OpenAI
+
+# Default maximum number of retries of failed requests by the OpenAI
+# client, which backs off exponentially and honors Retry-After headers
+DEFAULT_MAX_RETRIES = 5
+
+
+class OpenAIClients:
+    """
+    Synchronous and asynchronous OpenAI clients for an API key.
+
+    Each client keeps a pool of keep-alive connections, so components
+    sharing an instance, e.g., the extractor and the reranker of a
+    pipeline, reuse connections already opened by each other's requests
+    instead of each opening (and TLS handshaking) their own.
+    """
+
+    def __init__(self, api_key: str, max_retries: int = DEFAULT_MAX_RETRIES):
+        """Initialize the clients.
+
+        Parameters
+        ----------
+        api_key : str
+            OpenAI API key.
+        max_retries : int
+            Maximum number of times a request is retried on rate limit,
+            timeout, connection and server errors, with exponential
+            backoff. Defaults to 5.
+        """
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.client = OpenAI(api_key=api_key, max_retries=max_retries)
+        self._async_client = None
+        self._async_loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """AsyncOpenAI client bound to the running event loop.
+
+        Connections of an async client can't be shared across event
+        loops, so a new client is created when the loop changes, e.g.,
+        when aprocess is run with asyncio.run several times, and the
+        previous client is closed.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._async_client is None or self._async_loop is not loop:
+                if self._async_client is not None:
+                    _close_async_client(self._async_client, self._async_loop)
+                self._async_client = AsyncOpenAI(api_key=self.api_key,
+                                                 max_retries=self.max_retries)
+                self._async_loop = loop
+            return self._async_client
+
+    async def aclose(self):
+        """Close the async client, from the event loop it is bound to."""
+        with self._lock:
+            client, self._async_client = self._async_client, None
+            self._async_loop = None
+        if client is not None:
+            await client.close()
+
+
+def _close_async_client(client: AsyncOpenAI, loop: asyncio.AbstractEventLoop):
+    """Close an async client bound to another event loop.
+
+    If that loop is still running, e.g., in another thread, the client is
+    closed on it. Otherwise its connections are released from a temporary
+    loop in a helper thread, as the current thread is running a loop. The
+    connections' transports belong to the closed loop, so closing them
+    there raises once they have been released, which is ignored.
+    """
+    if loop.is_running():
+        asyncio.run_coroutine_threadsafe(client.close(), loop)
+        return
+
+    def close():
+        with contextlib.suppress(RuntimeError):
+            asyncio.run(client.close())
+
+    threading.Thread(target=close, daemon=True).start()
@@ -3,13 +3,43 @@ LLM-based disease extraction from clinical notes.
 """
 
 import json
+import logging
 import os
-from typing import Dict, Any, Optional
-from openai import OpenAI
+import re
+from typing import AsyncIterator, Dict, Any, List, Optional, Union
+import orjson
+from openai import AsyncOpenAI
 
-from .schemas import DISEASE_EXTRACTION_SCHEMA
+from .batch import get_batch_output_texts, submit_batch, wait_for_batch
+from .cache import MemoryResponseCache, ResponseCache
+from .clients import DEFAULT_MAX_RETRIES, OpenAIClients
+from .rate_limit import RateLimiter
+from .schemas import (
+    DISEASE_EXTRACTION_SCHEMA,
+    DISEASE_EXTRACTION_WITHOUT_CODES_SCHEMA
+)
 from .utils import validate_extraction_result, validate_icd10_code
 
+logger = logging.getLogger(__name__)
+
+# Constant system prompts give all requests the same prefix, for prompt caching
+_EXTRACTION_WITHOUT_CODES_SYSTEM_PROMPT = (
+    "You are a medical coding assistant that extracts diseases and supporting evidence "
+    "from clinical descriptions.\n\n"
+    "CRITICAL: For 'Supporting Evidence', you MUST extract EXACT verbatim text spans "
+    "from the input text. Do NOT paraphrase, reword, or summarize. Copy the text exactly "
+    "as it appears in the clinical description.\n\n"
+    "Example:\n"
+    "Input: 'Patient has chest pain and shortness of breath.'\n"
+    "Correct evidence: ['chest pain', 'shortness of breath']\n"
+    "WRONG evidence: ['Patient presents with chest discomfort', 'difficulty breathing']"
+)
+
+_EXTRACTION_SYSTEM_PROMPT = (
+    _EXTRACTION_WITHOUT_CODES_SYSTEM_PROMPT
+    + "\n\nProvide accurate ICD-10 codes for each identified disease."
+)
+
 
 class DiseaseExtractor:
     """
@@ -19,7 +49,12 @@ class DiseaseExtractor:
     def __init__(
         self,
         api_key: Optional[str] = None,
-        model: str = "gpt-4o-mini"
+        model: str = "gpt-4o-mini",
+        cache: Optional[Union[ResponseCache, MemoryResponseCache]] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        rate_limiter: Optional[RateLimiter] = None,
+        extract_codes: bool = True,
+        clients: Optional[OpenAIClients] = None
     ):
         """Initialize disease extractor.
 
@@ -29,14 +64,52 @@ class DiseaseExtractor:
             OpenAI API key. Defaults to OPENAI_API_KEY environment variable.
         model : str
             OpenAI model name. Defaults to "gpt-4o-mini".
+        cache : ResponseCache or MemoryResponseCache, optional
+            Cache of response texts, on disk or in memory. If given,
+            requests identical to earlier ones are answered from the cache
+            instead of calling the API. Defaults to None (no caching).
+        max_retries : int
+            Maximum number of times a request is retried on rate limit,
+            timeout, connection and server errors, with exponential
+            backoff. Defaults to 5.
+        rate_limiter : RateLimiter, optional
+            Rate limiter that requests wait for before being sent, which
+            can be shared with other components using the same API key.
+            Defaults to None (no limit).
+        extract_codes : bool
+            If True, the LLM also predicts an ICD-10 code for each disease,
+            returned as 'ICD10'. If False, only diseases and evidence are
+            extracted, which saves output tokens when codes are assigned by
+            re-ranking retrieved codes. Defaults to True.
+        clients : OpenAIClients, optional
+            OpenAI clients to send requests with, which can be shared with
+            other components using the same API key so that they reuse
+            each other's connections. Defaults to new clients for api_key
+            and max_retries.
         """
-        api_key = api_key or os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OpenAI API key required. Set OPENAI_API_KEY env var or pass api_key.")
+        if clients is None:
+            api_key = api_key or os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("OpenAI API key required. Set OPENAI_API_KEY env var or pass api_key.")
+            clients = OpenAIClients(api_key, max_retries)
 
-        self.client = OpenAI(api_key=api_key)
+        self.clients = clients
+        self.api_key = clients.api_key
+        self.max_retries = clients.max_retries
+        self.rate_limiter = rate_limiter
+        self.client = clients.client
         self.model = model
-        self.schema = DISEASE_EXTRACTION_SCHEMA
+        self.cache = cache
+        self.extract_codes = extract_codes
+        self.schema = (
+            DISEASE_EXTRACTION_SCHEMA if extract_codes
+            else DISEASE_EXTRACTION_WITHOUT_CODES_SCHEMA
+        )
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """AsyncOpenAI client bound to the running event loop."""
+        return self.clients.async_client
 
     def extract(
         self,
@@ -55,103 +128,355 @@ class DiseaseExtractor:
         Returns
         -------
         dict
-            Dictionary with 'Diseases' list containing disease info.
+            Dictionary with 'Diseases' list containing disease info. If
+            the request failed, the list is empty and 'error' holds the
+            error message.
         """
         if not clinical_description or not clinical_description.strip():
             return {"Diseases": []}
 
+        try:
+            request = self._build_request(clinical_description, system_prompt)
+            output_text = self.cache.get(request) if self.cache is not None else None
+            if output_text is None:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.wait()
+                response = self.client.responses.create(**request)
+                output_text = response.output_text
+                if self.cache is not None:
+                    self.cache.set(request, output_text)
+            return self._parse_response(output_text, clinical_description)
+
+        except Exception as e:
+            logger.error(f"Failed to extract diseases: {e}")
+            return {"Diseases": [], "error": str(e)}
+
+    async def aextract(
+        self,
+        clinical_description: str,
+        system_prompt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Extract diseases and ICD-10 codes asynchronously.
+
+        Same as extract, but sends the request with AsyncOpenAI so that
+        several extractions can run concurrently.
+
+        Parameters
+        ----------
+        clinical_description : str
+            Clinical note or description text.
+        system_prompt : str, optional
+            Optional custom system prompt.
+
+        Returns
+        -------
+        dict
+            Dictionary with 'Diseases' list containing disease info. If
+            the request failed, the list is empty and 'error' holds the
+            error message.
+        """
+        if not clinical_description or not clinical_description.strip():
+            return {"Diseases": []}
+
+        try:
+            request = self._build_request(clinical_description, system_prompt)
+            output_text = self.cache.get(request) if self.cache is not None else None
+            if output_text is None:
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire()
+                response = await self.async_client.responses.create(**request)
+                output_text = response.output_text
+                if self.cache is not None:
+                    self.cache.set(request, output_text)
+            return self._parse_response(output_text, clinical_description)
+
+        except Exception as e:
+            logger.error(f"Failed to extract diseases: {e}")
+            return {"Diseases": [], "error": str(e)}
+
+    async def astream_diseases(
+        self,
+        clinical_description: str,
+        system_prompt: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Extract diseases asynchronously, yielding each once generated.
+
+        The response is streamed and each element of its 'Diseases' list
+        is parsed, validated and yielded as soon as it is complete, so
+        that callers can process a disease while later ones are still
+        being generated.
+
+        Parameters
+        ----------
+        clinical_description : str
+            Clinical note or description text.
+        system_prompt : str, optional
+            Optional custom system prompt.
+
+        Yields
+        ------
+        dict
+            Validated disease info, as in the 'Diseases' list of extract.
+
+        Raises
+        ------
+        Exception
+            Errors of the request, e.g., once its retries are exhausted,
+            after the diseases completed before the error were yielded.
+        """
+        if not clinical_description or not clinical_description.strip():
+            return
+
+        request = self._build_request(clinical_description, system_prompt)
+        clinical_lower = clinical_description.lower()
+        is_verbatim = {}
+
+        if self.cache is not None:
+            output_text = self.cache.get(request)
+            if output_text is not None:
+                for disease in self._parse_response(output_text, clinical_description)['Diseases']:
+                    yield disease
+                return
+
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire()
+        stream = await self.async_client.responses.create(**request,
+                                                          stream=True)
+        parser = _DiseaseStreamParser()
+        async for event in stream:
+            if event.type != "response.output_text.delta":
+                continue
+            for disease in parser.feed(event.delta):
+                disease = self._validate_disease(disease, clinical_lower,
+                                                 is_verbatim)
+                if disease is not None:
+                    yield disease
+        if self.cache is not None and parser.done:
+            self.cache.set(request, parser.text)
+
+    def submit_batch(
+        self,
+        clinical_descriptions: List[str],
+        system_prompt: Optional[str] = None
+    ) -> str:
+        """Submit the extraction of several descriptions as an OpenAI batch.
+
+        Parameters
+        ----------
+        clinical_descriptions : list of str
+            Clinical notes or description texts. Empty descriptions are
+            not submitted.
+        system_prompt : str, optional
+            Optional custom system prompt.
+
+        Returns
+        -------
+        str
+            ID of the batch, to be passed to collect_batch.
+        """
+        requests = {
+            str(idx): self._build_request(clinical_description, system_prompt)
+            for idx, clinical_description in enumerate(clinical_descriptions)
+            if clinical_description and clinical_description.strip()
+        }
+        return submit_batch(self.client, requests)
+
+    def collect_batch(
+        self,
+        batch_id: str,
+        clinical_descriptions: List[str],
+        poll_interval: float = 60.0,
+        timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Wait for an extraction batch and parse its results.
+
+        Parameters
+        ----------
+        batch_id : str
+            ID of the batch returned by submit_batch.
+        clinical_descriptions : list of str
+            The clinical descriptions passed to submit_batch.
+        poll_interval : float
+            Time (seconds) between batch status checks. Defaults to 60.
+        timeout : float, optional
+            Maximum time (seconds) to wait for the batch.
+
+        Returns
+        -------
+        list of dict
+            Dictionary with 'Diseases' list for each description, in the
+            order of the descriptions, with 'error' if its request failed.
+        """
+        batch = wait_for_batch(self.client, batch_id, poll_interval, timeout)
+        output_texts = get_batch_output_texts(self.client, batch)
+        results = []
+        for idx, clinical_description in enumerate(clinical_descriptions):
+            if str(idx) in output_texts:
+                results.append(self._parse_response(output_texts[str(idx)],
+                                                    clinical_description))
+            elif clinical_description and clinical_description.strip():
+                results.append({"Diseases": [], "error": "Batch request failed"})
+            else:
+                results.append({"Diseases": []})
+        return results
+
+    def _build_request(
+        self,
+        clinical_description: str,
+        system_prompt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Build the arguments of the extraction responses.create call."""
         if system_prompt is None:
             system_prompt = (
-                "You are a medical coding assistant that extracts diseases and supporting evidence "
-                "from clinical descriptions.\n\n"
-                "CRITICAL: For 'Supporting Evidence', you MUST extract EXACT verbatim text spans "
-                "from the input text. Do NOT paraphrase, reword, or summarize. Copy the text exactly "
-                "as it appears in the clinical description.\n\n"
-                "Example:\n"
-                "Input: 'Patient has chest pain and shortness of breath.'\n"
-                "Correct evidence: ['chest pain', 'shortness of breath']\n"
-                "WRONG evidence: ['Patient presents with chest discomfort', 'difficulty breathing']\n\n"
-                "Provide accurate ICD-10 codes for each identified disease."
+                _EXTRACTION_SYSTEM_PROMPT if self.extract_codes
+                else _EXTRACTION_WITHOUT_CODES_SYSTEM_PROMPT
             )
 
-        try:
-            user_prompt = (
-                f"Extract diseases and supporting evidence from the following clinical description.\n\n"
-                f"IMPORTANT: For 'Supporting Evidence', copy EXACT text spans from the description below. "
-                f"Do not paraphrase or reword.\n\n"
-                f"Clinical Description:\n{clinical_description}"
-            )
+        user_prompt = (
+            f"Extract diseases and supporting evidence from the following clinical description.\n\n"
+            f"IMPORTANT: For 'Supporting Evidence', copy EXACT text spans from the description below. "
+            f"Do not paraphrase or reword.\n\n"
+            f"Clinical Description:\n{clinical_description}"
+        )
 
-            response = self.client.responses.create(
-                model=self.model,
-                input=[
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": user_prompt
-                    }
-                ],
-                text={
-                    "format": {
-                        "type": "json_schema",
-                        "name": "disease_evidence_icd10",
-                        "schema": self.schema,
-                        "strict": True
-                    }
+        return dict(
+            model=self.model,
+            input=[
+                {
+                    "role": "system",
+                    "content": system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": user_prompt
                 }
-            )
+            ],
+            text={
+                "format": {
+                    "type": "json_schema",
+                    "name": ("disease_evidence_icd10" if self.extract_codes
+                             else "disease_evidence"),
+                    "schema": self.schema,
+                    "strict": True
+                }
+            }
+        )
 
-            # Parse response
-            response_json = json.loads(response.output_text)
-
-            # Validate structure
-            if not validate_extraction_result(response_json):
-                print("Warning: Invalid response structure from LLM")
-                return {"Diseases": []}
-
-            # Validate ICD-10 codes and evidence
-            validated_diseases = []
-            clinical_lower = clinical_description.lower()
-
-            for disease in response_json.get('Diseases', []):
-                code = disease.get('ICD10', '')
-                if not validate_icd10_code(code):
-                    print(f"Warning: Invalid ICD-10 code '{code}' for disease '{disease.get('Disease', '')}'")
-                    continue
-
-                # Validate evidence strings are verbatim (case-insensitive check)
-                evidence = disease.get('Supporting Evidence', [])
-                validated_evidence = []
-
-                for ev in evidence:
-                    ev_clean = ev.strip()
-                    if not ev_clean:
-                        continue
-
-                    # Check if evidence is a substring of the input (case-insensitive)
-                    ev_lower = ev_clean.lower()
-                    if ev_lower in clinical_lower:
-                        validated_evidence.append(ev_clean)
-                    else:
-                        # Try to find fuzzy match - if it's very similar, it might be okay
-                        # But log a warning
-                        print(f"Warning: Evidence '{ev_clean[:50]}...' may not be verbatim from input text")
-                        validated_evidence.append(ev_clean)  # Still include it, but warn
-
-                # Update disease with validated evidence
-                disease['Supporting Evidence'] = validated_evidence
-                validated_diseases.append(disease)
-
-            return {"Diseases": validated_diseases}
-
-        except json.JSONDecodeError as e:
-            print(f"Error: Failed to parse JSON response: {e}")
+    def _parse_response(
+        self,
+        output_text: str,
+        clinical_description: str
+    ) -> Dict[str, Any]:
+        """Parse and validate the extraction response text."""
+        # Parse response
+        try:
+            response_json = orjson.loads(output_text)
+        except orjson.JSONDecodeError as e:
+            logger.error(f"Failed to parse JSON response: {e}")
             return {"Diseases": []}
 
-        except Exception as e:
-            print(f"Error: Failed to extract diseases: {e}")
+        # Validate structure
+        if not validate_extraction_result(response_json):
+            logger.warning("Invalid response structure from LLM")
             return {"Diseases": []}
 
+        # Validate ICD-10 codes and evidence
+        clinical_lower = clinical_description.lower()
+        # Diseases often share evidence strings, so the description is
+        # searched only once for each distinct one
+        is_verbatim = {}
+        validated_diseases = [
+            disease for disease in (
+                self._validate_disease(disease, clinical_lower, is_verbatim)
+                for disease in response_json.get('Diseases', [])
+            )
+            if disease is not None
+        ]
+
+        return {"Diseases": validated_diseases}
+
+    def _validate_disease(
+        self,
+        disease: Dict[str, Any],
+        clinical_lower: str,
+        is_verbatim: Dict[str, bool]
+    ) -> Optional[Dict[str, Any]]:
+        """Validate the ICD-10 code and evidence of an extracted disease.
+
+        Returns None if the code is invalid. is_verbatim memoizes which
+        lowercased evidence strings occur in clinical_lower.
+        """
+        if self.extract_codes:
+            code = disease.get('ICD10', '')
+            if not validate_icd10_code(code):
+                logger.warning(f"Invalid ICD-10 code '{code}' for disease '{disease.get('Disease', '')}'")
+                return None
+
+        # Validate evidence strings are verbatim (case-insensitive check)
+        evidence = disease.get('Supporting Evidence', [])
+        validated_evidence = []
+        seen = set()
+
+        for ev in evidence:
+            ev_clean = ev.strip()
+            # Skip empty and repeated evidence
+            if not ev_clean or ev_clean in seen:
+                continue
+            seen.add(ev_clean)
+            # Non-verbatim evidence is still included, but with a warning
+            validated_evidence.append(ev_clean)
+
+            # Check if evidence is a substring of the input (case-insensitive)
+            ev_lower = ev_clean.lower()
+            if ev_lower not in is_verbatim:
+                is_verbatim[ev_lower] = ev_lower in clinical_lower
+            if not is_verbatim[ev_lower]:
+                logger.warning(f"Evidence '{ev_clean[:50]}...' may not be verbatim from input text")
+
+        # Update disease with validated evidence
+        disease['Supporting Evidence'] = validated_evidence
+        return disease
+
+
+class _DiseaseStreamParser:
+    """Incrementally parse the 'Diseases' list of a streamed response.
+
+    Text is fed as it arrives, and each element of the list is returned
+    once the text contains all of it. The response schema guarantees that
+    the list is the value of the top-level 'Diseases' key and that its
+    elements are objects.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.done = False
+        self._pos = None
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, delta: str) -> List[Dict[str, Any]]:
+        """Add streamed text and return the newly completed diseases."""
+        self.text += delta
+        if self._pos is None:
+            match = re.search(r'"Diseases"\s*:\s*\[', self.text)
+            if match is None:
+                return []
+            self._pos = match.end()
+        diseases = []
+        while not self.done:
+            # Skip the separators between elements
+            while self._pos < len(self.text) and self.text[self._pos] in " \t\r\n,":
+                self._pos += 1
+            if self._pos == len(self.text):
+                break
+            if self.text[self._pos] == "]":
+                self.done = True
+                break
+            try:
+                disease, self._pos = self._decoder.raw_decode(self.text,
+                                                              self._pos)
+            except json.JSONDecodeError:
+                # The element isn't complete yet
+                break
+            if isinstance(disease, dict):
+                diseases.append(disease)
+        return diseases
@@ -2,26 +2,61 @@
 Main pipeline orchestrator for medical coding.
 """
 
+import asyncio
+import contextlib
+import copy
 import logging
+import os
+import threading
 import time
-from typing import Dict, Any, List, Optional, Union
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple, Union
 from pathlib import Path
 
 from .extractor import DiseaseExtractor
 from .retriever import ICD10Retriever
 from .reranker import CodeReranker
 from .annotator import annotate_raw_output
-from .utils import (
-    combine_text_for_retrieval,
-    get_icd10_name
-)
+from .cache import MemoryResponseCache, ResponseCache
+from .clients import DEFAULT_MAX_RETRIES, OpenAIClients
+from .rate_limit import RateLimiter
+from .utils import combine_text_for_retrieval
 
 from openacme.icd10.generate_embeddings import generate_icd10_embeddings
 
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Spans of the pipeline steps are recorded if OpenTelemetry is installed
+# and an application has configured a tracer provider
+tracer = trace.get_tracer(__name__) if trace is not None else None
+
+
+@lru_cache(maxsize=4)
+def get_retriever(precision: str = "float32") -> ICD10Retriever:
+    """Return the ICD-10 retriever shared by all pipelines.
+
+    Loading the code embeddings and the embedding model is by far the most
+    expensive part of creating a pipeline, and the retriever is safe to
+    use from several threads, so it is created once per process and
+    precision.
+
+    Parameters
+    ----------
+    precision : str
+        Precision in which the retriever stores code embeddings, see
+        ICD10Retriever. Defaults to "float32".
+    """
+    # Ensure embeddings are generated (this is idempotent - won't regenerate if they exist)
+    generate_icd10_embeddings()
+    return ICD10Retriever(precision=precision)
+
 
 class MedCoderPipeline:
     """
@@ -35,7 +70,18 @@ class MedCoderPipeline:
         openai_api_key: Optional[str] = None,
         openai_model: str = "gpt-4o-mini",
         retrieval_top_k: int = 10,
-        retrieval_min_similarity: float = 0.0
+        retrieval_min_similarity: float = 0.0,
+        max_concurrency: int = 8,
+        cache_responses: Union[bool, str] = False,
+        stream_extraction: bool = False,
+        joint_reranking: bool = False,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        requests_per_minute: Optional[float] = None,
+        rerank_skip_similarity: Optional[float] = None,
+        extract_codes: bool = True,
+        retrieval_precision: str = "float32",
+        max_concurrent_reranks: Optional[int] = None,
+        rerank_skip_margin: Optional[Tuple[float, float]] = None
     ):
         """Initialize the medical coding pipeline.
 
@@ -49,31 +95,119 @@ class MedCoderPipeline:
             Number of codes to retrieve per disease. Defaults to 10.
         retrieval_min_similarity : float
             Minimum similarity threshold for retrieval. Defaults to 0.0.
+        max_concurrency : int
+            Maximum number of clinical descriptions processed concurrently.
+            Defaults to 8.
+        cache_responses : bool or str
+            If True or "disk", cache extraction and re-ranking responses on
+            disk (requires diskcache), so that repeated descriptions and
+            diseases don't call the API again, also across runs. If
+            "memory", responses are only cached in this process, up to
+            the most recent 4096. Defaults to False.
+        stream_extraction : bool
+            If True, extraction responses are streamed, and each disease
+            is retrieved and re-ranked as soon as it has been generated,
+            overlapping with the generation of the following ones.
+            Only applies to process and aprocess. Defaults to False.
+        joint_reranking : bool
+            If True, the diseases of a description are re-ranked together
+            in a single LLM request instead of one concurrent request per
+            disease, which reduces the number of requests and the input
+            tokens (the system prompt is sent once) at the cost of a
+            longer response. Only applies to process and aprocess without
+            stream_extraction. Defaults to False.
+        max_retries : int
+            Maximum number of times an LLM request is retried on rate
+            limit, timeout, connection and server errors, with exponential
+            backoff. Defaults to 5.
+        requests_per_minute : float, optional
+            Maximum rate of LLM requests, shared by extraction and
+            re-ranking, e.g., to stay under the rate limit of the API key
+            with high max_concurrency. Defaults to None (no limit).
+        rerank_skip_similarity : float, optional
+            If set, the re-ranking request of a disease is skipped when the
+            top retrieved code is the code predicted by the LLM with at
+            least this similarity, e.g., 0.9, since both sources agree. The
+            retrieved codes are then used as re-ranked codes in their
+            retrieval order. Defaults to None (always re-rank).
+        extract_codes : bool
+            If False, the extraction doesn't ask the LLM for an initial
+            ICD-10 code of each disease, and codes are only chosen by
+            re-ranking the retrieved codes, which saves the output tokens
+            of the codes and their validation. rerank_skip_similarity then
+            has no effect. Defaults to True.
+        retrieval_precision : str
+            Precision in which code embeddings are stored for retrieval,
+            "float32", "float16" or "int8". Lower precisions use 2x or 4x
+            less memory and memory bandwidth per search, at a small cost
+            in similarity accuracy. Defaults to "float32".
+        max_concurrent_reranks : int, optional
+            Maximum number of re-ranking requests in flight at once across
+            all descriptions, since each of up to max_concurrency
+            descriptions re-ranks its diseases concurrently. Defaults to
+            None (no limit).
+        rerank_skip_margin : tuple of float, optional
+            A (similarity, margin) pair, e.g., (0.85, 0.1). If set, the
+            re-ranking request of a disease is also skipped when its top
+            retrieved code has at least this similarity and leads the
+            second one by at least this margin, since retrieval is then
+            unambiguous, whatever the LLM code. Defaults to None (no
+            margin-based skipping).
 
         Notes
         -----
         Embeddings are automatically loaded from openacme's default location.
         The pipeline will ensure embeddings exist by calling generate_icd10_embeddings()
-        if needed (idempotent operation).
+        if needed (idempotent operation). The retriever is shared by all
+        pipelines in the process, see get_retriever.
         """
         # Initialize components
+        if cache_responses == "memory":
+            cache = MemoryResponseCache()
+        elif cache_responses is True or cache_responses == "disk":
+            cache = ResponseCache()
+        elif not cache_responses:
+            cache = None
+        else:
+            raise ValueError(f"Unsupported response cache: {cache_responses}")
+        rate_limiter = (
+            RateLimiter(requests_per_minute) if requests_per_minute else None
+        )
+        # The extractor and the reranker share clients, so that
+        # re-ranking requests reuse the connections opened by extraction
+        api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OpenAI API key required. Set OPENAI_API_KEY env var or pass openai_api_key.")
+        clients = OpenAIClients(api_key, max_retries)
+        self.clients = clients
         self.extractor = DiseaseExtractor(
-            api_key=openai_api_key,
-            model=openai_model
+            model=openai_model,
+            cache=cache,
+            clients=clients,
+            rate_limiter=rate_limiter,
+            extract_codes=extract_codes
         )
 
-        # Ensure embeddings are generated (this is idempotent - won't regenerate if they exist)
-        generate_icd10_embeddings()
-
-        self.retriever = ICD10Retriever()
+        self.retriever = get_retriever(retrieval_precision)
 
         self.reranker = CodeReranker(
-            api_key=openai_api_key,
-            model=openai_model
+            model=openai_model,
+            cache=cache,
+            clients=clients,
+            rate_limiter=rate_limiter,
+            max_concurrent_requests=max_concurrent_reranks
         )
 
         self.retrieval_top_k = retrieval_top_k
         self.retrieval_min_similarity = retrieval_min_similarity
+        self.max_concurrency = max_concurrency
+        self.stream_extraction = stream_extraction
+        self.joint_reranking = joint_reranking
+        self.rerank_skip_similarity = rerank_skip_similarity
+        self.rerank_skip_margin = rerank_skip_margin
+        # Event loop on which process runs aprocess, see _run
+        self._loop = None
+        self._loop_lock = threading.Lock()
 
     def process(
         self,
@@ -83,6 +217,12 @@ class MedCoderPipeline:
     ) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
         """Process clinical description(s) through full pipeline.
 
+        This runs aprocess on an event loop owned by the pipeline in a
+        background thread, so it can also be called from code running in
+        an event loop (blocking it until done, where aprocess can be
+        awaited instead), and the connections of the pipeline's clients
+        are reused across calls.
+
         Parameters
         ----------
         clinical_descriptions : str or list of str
@@ -99,7 +239,77 @@ class MedCoderPipeline:
         dict or list of dict
             If single description: Dictionary with {"Diseases": [...]}.
             If list of descriptions: List of dictionaries (one per description),
-            each with {"Diseases": [...]}.
+            each with {"Diseases": [...]}. If an LLM request failed, e.g.,
+            after its retries, the dictionary of the description or
+            disease has an "error" key with the error message.
+        """
+        return self._run(self.aprocess(
+            clinical_descriptions,
+            annotate_evidence=annotate_evidence,
+            annotation_min_similarity=annotation_min_similarity
+        ))
+
+    def _run(self, coroutine):
+        """Run a coroutine on the pipeline's event loop and return its result.
+
+        The loop is started on first use and runs for the lifetime of the
+        pipeline, so that the async clients bound to it are reused.
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever,
+                                 name="medcoder-pipeline", daemon=True).start()
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            coroutine.close()
+            raise RuntimeError("MedCoderPipeline.process can't be called from "
+                               "the pipeline's own event loop, await aprocess.")
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def close(self):
+        """Close the pipeline's clients and stop its event loop."""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self.clients.aclose(),
+                                             loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+        self.clients.client.close()
+
+    async def aprocess(
+        self,
+        clinical_descriptions: Union[str, List[str]],
+        annotate_evidence: bool = True,
+        annotation_min_similarity: float = 0.7
+    ) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        """Process clinical description(s) through full pipeline asynchronously.
+
+        Descriptions are processed concurrently, up to max_concurrency at a
+        time, so that their LLM requests overlap.
+
+        Parameters
+        ----------
+        clinical_descriptions : str or list of str
+            Clinical note(s) or description text(s). Can be a single string
+            or a list of strings.
+        annotate_evidence : bool
+            If True, add character spans for evidence strings. Defaults to True.
+        annotation_min_similarity : float
+            Minimum similarity threshold for evidence annotation (0.0-1.0).
+            Defaults to 0.7.
+
+        Returns
+        -------
+        dict or list of dict
+            If single description: Dictionary with {"Diseases": [...]}.
+            If list of descriptions: List of dictionaries (one per description),
+            each with {"Diseases": [...]}. If an LLM request failed, e.g.,
+            after its retries, the dictionary of the description or
+            disease has an "error" key with the error message.
         """
         # Normalize input to list
         is_single = isinstance(clinical_descriptions, str)
@@ -108,127 +318,431 @@ class MedCoderPipeline:
         if not descriptions_list:
             return [] if not is_single else {"Diseases": []}
 
-        logger.info(f"Starting MedCoder pipeline for {len(descriptions_list)} clinical description(s)")
+        logger.info("Starting MedCoder pipeline for %d clinical description(s)",
+                    len(descriptions_list))
 
-        results = []
+        # Identical descriptions (e.g., repeated notes in evaluation sets)
+        # are only processed once
+        unique_descriptions = list(dict.fromkeys(descriptions_list))
 
-        for idx, clinical_description in enumerate(descriptions_list, 1):
-            step_times = {}
-            total_start = time.time()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
 
-            if len(descriptions_list) > 1:
-                logger.info(f"Processing description {idx}/{len(descriptions_list)}")
-
-            # Step 1: Extract diseases using LLM
-            logger.debug("Step 1: Extracting diseases and initial ICD-10 codes")
+        async def process_bounded(idx, clinical_description):
+            async with semaphore:
+                return await self._aprocess_description(
+                    idx,
+                    len(unique_descriptions),
+                    clinical_description,
+                    annotate_evidence,
+                    annotation_min_similarity
+                )
 
-            step1_start = time.time()
-            extraction_result = self.extractor.extract(clinical_description)
-            step1_time = time.time() - step1_start
-            step_times['extraction'] = step1_time
+        unique_results = await asyncio.gather(*(
+            process_bounded(idx, clinical_description)
+            for idx, clinical_description in enumerate(unique_descriptions, 1)
+        ))
+        results = _expand_duplicates(descriptions_list, unique_descriptions,
+                                     unique_results)
 
-            diseases = extraction_result.get('Diseases', [])
+        logger.info("Pipeline completed for %d description(s)", len(descriptions_list))
 
-            logger.info(f"Extraction completed in {step1_time:.2f}s, found {len(diseases)} disease(s)")
+        # Return single result if single input, list if multiple inputs
+        return results[0] if is_single else results
 
-            if not diseases:
-                logger.warning("No diseases extracted from clinical description")
-                result = {"Diseases": []}
-                results.append(result)
-                continue
+    def process_batch_api(
+        self,
+        clinical_descriptions: List[str],
+        annotate_evidence: bool = True,
+        annotation_min_similarity: float = 0.7,
+        poll_interval: float = 60.0,
+        timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Process clinical descriptions using the OpenAI Batch API.
 
-            # Step 2: Retrieve additional codes using semantic search
-            logger.debug(f"Step 2: Retrieving top-{self.retrieval_top_k} similar codes for each disease")
+        The extraction requests of all descriptions are submitted as one
+        batch, codes are then retrieved locally, and the re-ranking
+        requests of all diseases are submitted as a second batch. Batches
+        cost less and don't count against the synchronous rate limits,
+        but can take up to 24 hours each, so this is meant for bulk
+        offline jobs.
 
-            step2_start = time.time()
+        Parameters
+        ----------
+        clinical_descriptions : list of str
+            Clinical notes or description texts.
+        annotate_evidence : bool
+            If True, add character spans for evidence strings. Defaults to True.
+        annotation_min_similarity : float
+            Minimum similarity threshold for evidence annotation (0.0-1.0).
+            Defaults to 0.7.
+        poll_interval : float
+            Time (seconds) between batch status checks. Defaults to 60.
+        timeout : float, optional
+            Maximum time (seconds) to wait for each batch.
 
-            for disease in diseases:
-                disease_name = disease.get('Disease', '')
-                evidence = disease.get('Supporting Evidence', [])
+        Returns
+        -------
+        list of dict
+            List of dictionaries (one per description), each with
+            {"Diseases": [...]}. If an LLM request failed, the dictionary
+            of the description or disease has an "error" key.
+        """
+        if not any(d and d.strip() for d in clinical_descriptions):
+            return [{"Diseases": []} for _ in clinical_descriptions]
 
-                # Combine disease name + evidence for richer retrieval
-                retrieval_text = combine_text_for_retrieval(disease_name, evidence)
+        logger.info("Starting MedCoder batch pipeline for %d clinical description(s)",
+                    len(clinical_descriptions))
 
-                # Retrieve codes
-                retrieved = self.retriever.retrieve(
-                    retrieval_text,
-                    top_k=self.retrieval_top_k,
-                    min_similarity=self.retrieval_min_similarity
-                )
+        # Identical descriptions are only submitted once
+        unique_descriptions = list(dict.fromkeys(clinical_descriptions))
 
-                disease['retrieved_codes'] = retrieved
-                logger.debug(f"Retrieved {len(retrieved)} codes for disease: {disease_name}")
+        # Step 1: Extract diseases using an LLM batch
+        batch_id = self.extractor.submit_batch(unique_descriptions)
+        results = self.extractor.collect_batch(
+            batch_id, unique_descriptions,
+            poll_interval=poll_interval, timeout=timeout
+        )
+        diseases = [disease for result in results
+                    for disease in result['Diseases']]
+        logger.info("Extraction batch completed, found %d disease(s)", len(diseases))
+
+        # Step 2: Retrieve additional codes using semantic search
+        self._retrieve_codes(diseases)
+
+        # Step 3: Re-rank codes using an LLM batch
+        to_rerank = [disease for disease in diseases
+                     if not self._skip_reranking(disease)]
+        candidates = [self._reranking_candidate(disease) for disease in to_rerank]
+        if any(candidate['retrieved_codes'] for candidate in candidates):
+            batch_id = self.reranker.submit_batch(candidates)
+            reranking_results = self.reranker.collect_batch(
+                batch_id, candidates,
+                poll_interval=poll_interval, timeout=timeout
+            )
+        else:
+            reranking_results = [{"Reranked ICD-10 Codes": []}] * len(candidates)
+        for disease, reranking_result in zip(to_rerank, reranking_results):
+            _set_reranked_codes(disease, reranking_result)
+        logger.info("Re-ranking batch completed for %d disease(s)", len(diseases))
+
+        # Add evidence spans if requested
+        if annotate_evidence:
+            results = [
+                annotate_raw_output(clinical_description, result,
+                                    annotation_min_similarity)
+                for clinical_description, result
+                in zip(unique_descriptions, results)
+            ]
+
+        return _expand_duplicates(clinical_descriptions, unique_descriptions,
+                                  results)
+
+    async def _aprocess_description(
+        self,
+        idx: int,
+        num_descriptions: int,
+        clinical_description: str,
+        annotate_evidence: bool,
+        annotation_min_similarity: float
+    ) -> Dict[str, Any]:
+        """Process a single clinical description through the pipeline."""
+        if self.stream_extraction:
+            return await self._aprocess_description_streaming(
+                idx,
+                clinical_description,
+                annotate_evidence,
+                annotation_min_similarity
+            )
 
-            step2_time = time.time() - step2_start
-            step_times['retrieval'] = step2_time
+        loop = asyncio.get_running_loop()
+        step_times = {}
+        total_start = time.time()
 
-            logger.info(f"Retrieval completed in {step2_time:.2f}s for {len(diseases)} disease(s)")
+        if num_descriptions > 1:
+            logger.info("Processing description %d/%d", idx, num_descriptions)
 
-            # Step 3: Re-rank codes using LLM
-            logger.debug("Step 3: Re-ranking codes")
+        # Step 1: Extract diseases using LLM
+        logger.debug("Step 1: Extracting diseases and initial ICD-10 codes")
 
-            step3_start = time.time()
+        step1_start = time.time()
+        with _span("medcoder.extraction") as span:
+            extraction_result = await self.extractor.aextract(clinical_description)
+            diseases = extraction_result.get('Diseases', [])
+            span.set_attribute("n_diseases", len(diseases))
+        step1_time = time.time() - step1_start
+        step_times['extraction'] = step1_time
+
+        logger.info("Extraction completed in %.2fs, found %d disease(s)",
+                    step1_time, len(diseases))
+
+        if 'error' in extraction_result:
+            return {"Diseases": [], "error": extraction_result['error']}
+
+        if not diseases:
+            logger.warning("No diseases extracted from clinical description")
+            return {"Diseases": []}
+
+        # Step 2: Retrieve additional codes using semantic search
+        logger.debug("Step 2: Retrieving top-%d similar codes for each disease",
+                     self.retrieval_top_k)
+
+        step2_start = time.time()
+
+        # Retrieval is CPU-bound, run it in the thread pool so that it
+        # doesn't block other descriptions' requests on the event loop
+        with _span("medcoder.retrieval") as span:
+            span.set_attribute("n_diseases", len(diseases))
+            await loop.run_in_executor(None, self._retrieve_codes, diseases)
+
+        step2_time = time.time() - step2_start
+        step_times['retrieval'] = step2_time
+
+        logger.info("Retrieval completed in %.2fs for %d disease(s)",
+                    step2_time, len(diseases))
+
+        # Step 3: Re-rank codes using LLM
+        logger.debug("Step 3: Re-ranking codes")
+
+        step3_start = time.time()
+
+        with _span("medcoder.reranking") as span:
+            span.set_attribute("n_diseases", len(diseases))
+            if self.joint_reranking:
+                to_rerank = [disease for disease in diseases
+                             if not self._skip_reranking(disease)]
+                candidates = [self._reranking_candidate(disease)
+                              for disease in to_rerank]
+                reranking_results = await self.reranker.arerank_many(candidates)
+                for disease, reranking_result in zip(to_rerank, reranking_results):
+                    _set_reranked_codes(disease, reranking_result)
+            else:
+                # Diseases are independent, re-rank them concurrently
+                await asyncio.gather(*(
+                    self._arerank_disease(disease) for disease in diseases
+                ))
+
+        step3_time = time.time() - step3_start
+        step_times['reranking'] = step3_time
+
+        logger.info("Re-ranking completed in %.2fs for %d disease(s)",
+                    step3_time, len(diseases))
+
+        total_time = time.time() - total_start
+        step_times['total'] = total_time
+
+        if num_descriptions > 1:
+            logger.info("Completed description %d/%d in %.2fs",
+                        idx, num_descriptions, total_time)
+
+        # Log timing breakdown
+        logger.info(
+            "Description %d timing breakdown: "
+            "Extraction=%.2fs, Retrieval=%.2fs, Re-ranking=%.2fs, Total=%.2fs",
+            idx,
+            step_times['extraction'],
+            step_times['retrieval'],
+            step_times['reranking'],
+            step_times['total']
+        )
 
-            for disease in diseases:
-                disease_name = disease.get('Disease', '')
-                evidence = disease.get('Supporting Evidence', [])
-                llm_code = disease.get('ICD10', '')
-                llm_code_name = get_icd10_name(llm_code)
-                retrieved_codes = disease.get('retrieved_codes', [])
+        # Return raw format
+        result = {"Diseases": diseases}
+
+        # Add evidence spans if requested
+        if annotate_evidence:
+            logger.debug("Annotating evidence spans")
+            result = await loop.run_in_executor(
+                None,
+                annotate_raw_output,
+                clinical_description,
+                result,
+                annotation_min_similarity
+            )
 
-                # Re-rank
-                reranking_result = self.reranker.rerank(
-                    disease=disease_name,
-                    evidence=evidence,
-                    llm_code=llm_code,
-                    llm_code_name=llm_code_name,
-                    retrieved_codes=retrieved_codes
-                )
+        return result
 
-                disease['reranked_codes'] = reranking_result.get('Reranked ICD-10 Codes', [])
-                disease['llm_code_name'] = llm_code_name
+    async def _aprocess_description_streaming(
+        self,
+        idx: int,
+        clinical_description: str,
+        annotate_evidence: bool,
+        annotation_min_similarity: float
+    ) -> Dict[str, Any]:
+        """Process a single clinical description while its extraction streams.
 
-                num_reranked = len(disease['reranked_codes'])
-                logger.debug(f"Re-ranked {num_reranked} codes for disease: {disease_name}")
+        Each disease is retrieved and re-ranked as soon as it has been
+        extracted, while the following ones are still being generated.
+        """
+        loop = asyncio.get_running_loop()
+        total_start = time.time()
+
+        diseases = []
+        tasks = []
+        error = None
+        try:
+            try:
+                async for disease in self.extractor.astream_diseases(clinical_description):
+                    diseases.append(disease)
+                    tasks.append(loop.create_task(self._aretrieve_and_rerank(disease)))
+            except Exception as e:
+                # Diseases streamed before the error are still processed
+                logger.error("Failed to extract diseases: %s", e)
+                error = str(e)
+            extraction_time = time.time() - total_start
+
+            logger.info("Extraction completed in %.2fs, found %d disease(s)",
+                        extraction_time, len(diseases))
+
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if not diseases:
+            if error is not None:
+                return {"Diseases": [], "error": error}
+            logger.warning("No diseases extracted from clinical description")
+            return {"Diseases": []}
+
+        total_time = time.time() - total_start
+        logger.info(
+            "Description %d timing breakdown (streamed): "
+            "Extraction=%.2fs, Total=%.2fs",
+            idx, extraction_time, total_time
+        )
 
-            step3_time = time.time() - step3_start
-            step_times['reranking'] = step3_time
+        # Return raw format
+        result = {"Diseases": diseases}
+        if error is not None:
+            result['error'] = error
+
+        # Add evidence spans if requested
+        if annotate_evidence:
+            logger.debug("Annotating evidence spans")
+            result = await loop.run_in_executor(
+                None,
+                annotate_raw_output,
+                clinical_description,
+                result,
+                annotation_min_similarity
+            )
 
-            logger.info(f"Re-ranking completed in {step3_time:.2f}s for {len(diseases)} disease(s)")
+        return result
 
-            total_time = time.time() - total_start
-            step_times['total'] = total_time
+    async def _aretrieve_and_rerank(self, disease: Dict[str, Any]):
+        """Retrieve and re-rank codes of a disease, in place."""
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._retrieve_codes, [disease]
+        )
+        await self._arerank_disease(disease)
+
+    async def _arerank_disease(self, disease: Dict[str, Any]):
+        """Re-rank the retrieved codes of a disease, in place."""
+        if self._skip_reranking(disease):
+            return
+
+        disease_name = disease.get('Disease', '')
+        evidence = disease.get('Supporting Evidence', [])
+        llm_code = disease.get('ICD10', '')
+        llm_code_name = self.retriever.get_code_name(llm_code) if llm_code else ''
+        retrieved_codes = disease.get('retrieved_codes', [])
+
+        # Re-rank
+        reranking_result = await self.reranker.arerank(
+            disease=disease_name,
+            evidence=evidence,
+            llm_code=llm_code,
+            llm_code_name=llm_code_name,
+            retrieved_codes=retrieved_codes
+        )
 
-            if len(descriptions_list) > 1:
-                logger.info(f"Completed description {idx}/{len(descriptions_list)} in {total_time:.2f}s")
+        _set_reranked_codes(disease, reranking_result)
+        disease['llm_code_name'] = llm_code_name
 
-            # Log timing breakdown
-            logger.info(
-                f"Description {idx} timing breakdown: "
-                f"Extraction={step_times['extraction']:.2f}s, "
-                f"Retrieval={step_times['retrieval']:.2f}s, "
-                f"Re-ranking={step_times['reranking']:.2f}s, "
-                f"Total={step_times['total']:.2f}s"
-            )
+        num_reranked = len(disease['reranked_codes'])
+        logger.debug("Re-ranked %d codes for disease: %s", num_reranked, disease_name)
 
-            # Return raw format
-            result = {"Diseases": diseases}
+    def _skip_reranking(self, disease: Dict[str, Any]) -> bool:
+        """Use the retrieved codes as re-ranked codes if they are decisive.
 
-            # Add evidence spans if requested
-            if annotate_evidence:
-                logger.debug("Annotating evidence spans")
-                result = annotate_raw_output(
-                    clinical_description,
-                    result,
-                    min_similarity=annotation_min_similarity
-                )
+        Returns True, after setting the re-ranked codes of the disease in
+        place, if its top retrieved code is its LLM code with a similarity
+        of at least rerank_skip_similarity, or if the top retrieved code
+        clears the similarity and margin of rerank_skip_margin.
+        """
+        llm_code = disease.get('ICD10', '')
+        retrieved_codes = disease.get('retrieved_codes', [])
+        if not retrieved_codes:
+            return False
+        top_similarity = retrieved_codes[0]['similarity']
+        agrees = bool(
+            self.rerank_skip_similarity is not None
+            and llm_code
+            and retrieved_codes[0]['code'] == llm_code
+            and top_similarity >= self.rerank_skip_similarity
+        )
+        unambiguous = False
+        if self.rerank_skip_margin is not None:
+            min_similarity, min_margin = self.rerank_skip_margin
+            second_similarity = (
+                retrieved_codes[1]['similarity'] if len(retrieved_codes) > 1
+                else float('-inf')
+            )
+            unambiguous = (top_similarity >= min_similarity
+                           and top_similarity - second_similarity >= min_margin)
+        if not (agrees or unambiguous):
+            return False
+
+        disease['reranked_codes'] = [
+            {
+                'ICD-10 Code': code_info['code'],
+                'ICD-10 Name': code_info['name'],
+                'similarity': code_info['similarity']
+            }
+            for code_info in retrieved_codes
+        ]
+        disease['llm_code_name'] = (
+            self.retriever.get_code_name(llm_code) if llm_code else ''
+        )
+        logger.debug("Skipped re-ranking for disease: %s", disease.get('Disease', ''))
+        return True
+
+    def _reranking_candidate(self, disease: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the reranker arguments of a disease, adding its code name."""
+        llm_code = disease.get('ICD10', '')
+        disease['llm_code_name'] = self.retriever.get_code_name(llm_code) if llm_code else ''
+        return dict(
+            disease=disease.get('Disease', ''),
+            evidence=disease.get('Supporting Evidence', []),
+            llm_code=llm_code,
+            llm_code_name=disease['llm_code_name'],
+            retrieved_codes=disease.get('retrieved_codes', [])
+        )
 
-            results.append(result)
+    def _retrieve_codes(self, diseases: List[Dict[str, Any]]):
+        """Retrieve candidate codes for each disease, in place.
 
-        logger.info(f"Pipeline completed for {len(descriptions_list)} description(s)")
+        The retrieval texts of all diseases are encoded and searched
+        together rather than one retrieve call per disease.
+        """
+        # Combine disease name + evidence for richer retrieval
+        retrieval_texts = [
+            combine_text_for_retrieval(disease.get('Disease', ''),
+                                       disease.get('Supporting Evidence', []))
+            for disease in diseases
+        ]
+
+        # Retrieve codes
+        retrieved_per_disease = self.retriever.retrieve_batch(
+            retrieval_texts,
+            top_k=self.retrieval_top_k,
+            min_similarity=self.retrieval_min_similarity
+        )
 
-        # Return single result if single input, list if multiple inputs
-        return results[0] if is_single else results
+        for disease, retrieved in zip(diseases, retrieved_per_disease):
+            disease['retrieved_codes'] = retrieved
+            logger.debug("Retrieved %d codes for disease: %s", len(retrieved),
+                         disease.get('Disease', ''))
 
     def extract_only(
         self,
@@ -273,3 +787,43 @@ class MedCoderPipeline:
             min_similarity=self.retrieval_min_similarity
         )
 
+
+def _expand_duplicates(
+    items: List[str],
+    unique_items: List[str],
+    unique_results: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Return the result of each item from the results of the unique items.
+
+    Repeated items get deep copies of the result, so that all returned
+    results are independent of each other.
+    """
+    result_by_item = dict(zip(unique_items, unique_results))
+    results = []
+    seen = set()
+    for item in items:
+        result = result_by_item[item]
+        results.append(copy.deepcopy(result) if item in seen else result)
+        seen.add(item)
+    return results
+
+
+def _set_reranked_codes(disease: Dict[str, Any], reranking_result: Dict[str, Any]):
+    """Set the re-ranked codes of a disease, and the error if re-ranking failed."""
+    disease['reranked_codes'] = reranking_result.get('Reranked ICD-10 Codes', [])
+    if 'error' in reranking_result:
+        disease['error'] = reranking_result['error']
+
+
+class _NoSpan:
+    """Stand-in for a tracing span when OpenTelemetry isn't installed."""
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+
+def _span(name: str):
+    """Return a context manager recording a tracing span of the given name."""
+    if tracer is None:
+        return contextlib.nullcontext(_NoSpan())
+    return tracer.start_as_current_span(name)
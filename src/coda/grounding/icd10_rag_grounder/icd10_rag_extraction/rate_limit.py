@@ -0,0 +1,60 @@
+"""
+Client-side rate limiting of LLM requests.
+"""
+
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Limit the rate at which requests are sent.
+
+    Requests are spaced evenly at the given rate, allowing bursts of up to
+    `burst` requests after idle periods. The limiter holds no event loop
+    bound state, so it can be shared across threads and event loops, e.g.,
+    by the extractor and the reranker across MedCoderPipeline.process calls.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int = 1):
+        """Initialize the rate limiter.
+
+        Parameters
+        ----------
+        requests_per_minute : float
+            Maximum sustained number of requests per minute.
+        burst : int
+            Maximum number of requests sent at once. Defaults to 1.
+        """
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive.")
+        if burst < 1:
+            raise ValueError("burst must be at least 1.")
+        self.interval = 60.0 / requests_per_minute
+        self.burst = burst
+        # Theoretical time at which the next request would be sent if
+        # requests were sent exactly at the rate
+        self._next_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Reserve a slot for a request and return the time to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            next_time = max(self._next_time, now)
+            send_time = max(now, next_time - (self.burst - 1) * self.interval)
+            self._next_time = next_time + self.interval
+            return send_time - now
+
+    async def acquire(self):
+        """Wait until a request may be sent."""
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def wait(self):
+        """Block until a request may be sent."""
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
@@ -2,14 +2,45 @@
 LLM-based re-ranking of retrieved ICD-10 codes.
 """
 
-import json
+import asyncio
+import contextlib
+import logging
 import os
-from typing import Dict, Any, List, Optional
-from openai import OpenAI
+from typing import Dict, Any, List, Optional, Union
+import orjson
+from openai import AsyncOpenAI
 
-from .schemas import RERANKING_SCHEMA
+from .batch import get_batch_output_texts, submit_batch, wait_for_batch
+from .cache import MemoryResponseCache, ResponseCache
+from .clients import DEFAULT_MAX_RETRIES, OpenAIClients
+from .rate_limit import RateLimiter
+from .schemas import MULTI_RERANKING_SCHEMA, RERANKING_SCHEMA
 from .utils import validate_icd10_code
 
+logger = logging.getLogger(__name__)
+
+_RERANKING_SYSTEM_PROMPT = """You are a medical coding expert that re-ranks retrieved ICD-10 codes.
+
+Consider these factors (in order of importance):
+1. **Clinical accuracy**: Does the code accurately represent the diagnosed disease?
+2. **Evidence alignment**: Does the code match the supporting clinical evidence?
+3. **Specificity**: Prefer more specific codes over general ones when appropriate
+4. **Retrieval confidence**: Consider the embedding similarity scores (higher = more relevant)
+5. **LLM consistency**: How well does the code align with the initial LLM prediction?
+
+Return ONLY JSON that matches the provided schema, ordered from most to least appropriate."""
+
+_MULTI_RERANKING_SYSTEM_PROMPT = """You are a medical coding expert that re-ranks retrieved ICD-10 codes for several diseases.
+
+For each disease, consider these factors (in order of importance):
+1. **Clinical accuracy**: Does the code accurately represent the diagnosed disease?
+2. **Evidence alignment**: Does the code match the supporting clinical evidence?
+3. **Specificity**: Prefer more specific codes over general ones when appropriate
+4. **Retrieval confidence**: Consider the embedding similarity scores (higher = more relevant)
+5. **LLM consistency**: How well does the code align with the initial LLM prediction?
+
+Return ONLY JSON that matches the provided schema, with one result per disease in the order the diseases are given, each ordered from most to least appropriate."""
+
 
 class CodeReranker:
     """
@@ -19,7 +50,12 @@ class CodeReranker:
     def __init__(
         self,
         api_key: Optional[str] = None,
-        model: str = "gpt-4o-mini"
+        model: str = "gpt-4o-mini",
+        cache: Optional[Union[ResponseCache, MemoryResponseCache]] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_concurrent_requests: Optional[int] = None,
+        clients: Optional[OpenAIClients] = None
     ):
         """Initialize code reranker.
 
@@ -29,15 +65,66 @@ class CodeReranker:
             OpenAI API key. Defaults to OPENAI_API_KEY environment variable.
         model : str
             OpenAI model name. Defaults to "gpt-4o-mini".
+        cache : ResponseCache or MemoryResponseCache, optional
+            Cache of response texts, on disk or in memory. If given,
+            requests identical to earlier ones are answered from the cache
+            instead of calling the API. Defaults to None (no caching).
+        max_retries : int
+            Maximum number of times a request is retried on rate limit,
+            timeout, connection and server errors, with exponential
+            backoff. Defaults to 5.
+        rate_limiter : RateLimiter, optional
+            Rate limiter that requests wait for before being sent, which
+            can be shared with other components using the same API key.
+            Defaults to None (no limit).
+        max_concurrent_requests : int, optional
+            Maximum number of asynchronous re-ranking requests in flight
+            at once, e.g., to stay under the API's concurrency limits when
+            many diseases are re-ranked concurrently. Defaults to None
+            (no limit).
+        clients : OpenAIClients, optional
+            OpenAI clients to send requests with, which can be shared with
+            other components using the same API key so that they reuse
+            each other's connections. Defaults to new clients for api_key
+            and max_retries.
         """
-        api_key = api_key or os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OpenAI API key required. Set OPENAI_API_KEY env var or pass api_key.")
+        if clients is None:
+            api_key = api_key or os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("OpenAI API key required. Set OPENAI_API_KEY env var or pass api_key.")
+            clients = OpenAIClients(api_key, max_retries)
 
-        self.client = OpenAI(api_key=api_key)
+        self.clients = clients
+        self.api_key = clients.api_key
+        self.max_retries = clients.max_retries
+        self.rate_limiter = rate_limiter
+        self.max_concurrent_requests = max_concurrent_requests
+        self._semaphore = None
+        self._semaphore_loop = None
+        self.client = clients.client
         self.model = model
+        self.cache = cache
         self.schema = RERANKING_SCHEMA
 
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """AsyncOpenAI client bound to the running event loop."""
+        return self.clients.async_client
+
+    def _request_slot(self):
+        """Return an async context manager bounding concurrent requests.
+
+        Like the async client, the semaphore is bound to the running
+        event loop, so a new one is created when the loop changes.
+        """
+        if self.max_concurrent_requests is None:
+            return contextlib.nullcontext()
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+            self._semaphore_loop = loop
+        return self._semaphore
+
     def rerank(
         self,
         disease: str,
@@ -56,7 +143,8 @@ class CodeReranker:
         evidence : list of str
             List of supporting evidence strings.
         llm_code : str
-            Initial ICD-10 code from LLM.
+            Initial ICD-10 code from LLM, or an empty string if there is
+            none, in which case the prediction is left out of the prompt.
         llm_code_name : str
             Name corresponding to llm_code.
         retrieved_codes : list of dict
@@ -67,101 +155,441 @@ class CodeReranker:
         Returns
         -------
         dict
-            Dictionary with 'Reranked ICD-10 Codes' list.
+            Dictionary with 'Reranked ICD-10 Codes' list. If the request
+            failed, the list is empty and 'error' holds the error message.
         """
         if not retrieved_codes:
             return {"Reranked ICD-10 Codes": []}
 
-        # Format retrieved codes with similarity scores
-        retrieved_codes_formatted = []
-        for code_info in retrieved_codes:
-            code = code_info.get('code', '')
-            name = code_info.get('name', '')
-            similarity = code_info.get('similarity', 0.0)
-            retrieved_codes_formatted.append(
-                f"  - Code: {code}, Name: {name}, Similarity: {similarity:.3f}"
-            )
+        try:
+            request = self._build_request(disease, evidence, llm_code,
+                                          llm_code_name, retrieved_codes,
+                                          system_prompt)
+            output_text = self.cache.get(request) if self.cache is not None else None
+            if output_text is None:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.wait()
+                response = self.client.responses.create(**request)
+                output_text = response.output_text
+                if self.cache is not None:
+                    self.cache.set(request, output_text)
+            return self._parse_response(output_text, retrieved_codes)
 
-        if system_prompt is None:
-            system_prompt = """You are a medical coding expert that re-ranks retrieved ICD-10 codes.
+        except Exception as e:
+            logger.error(f"Failed to rerank codes: {e}")
+            return {"Reranked ICD-10 Codes": [], "error": str(e)}
 
-Consider these factors (in order of importance):
-1. **Clinical accuracy**: Does the code accurately represent the diagnosed disease?
-2. **Evidence alignment**: Does the code match the supporting clinical evidence?
-3. **Specificity**: Prefer more specific codes over general ones when appropriate
-4. **Retrieval confidence**: Consider the embedding similarity scores (higher = more relevant)
-5. **LLM consistency**: How well does the code align with the initial LLM prediction?
+    async def arerank(
+        self,
+        disease: str,
+        evidence: List[str],
+        llm_code: str,
+        llm_code_name: str,
+        retrieved_codes: List[Dict[str, Any]],
+        system_prompt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Re-rank retrieved ICD-10 codes asynchronously.
 
-Return ONLY JSON that matches the provided schema, ordered from most to least appropriate."""
+        Same as rerank, but sends the request with AsyncOpenAI so that
+        several re-rankings can run concurrently.
 
-        evidence_text = "\n".join(f"  - {e}" for e in evidence) if evidence else "  (No specific evidence provided)"
+        Parameters
+        ----------
+        disease : str
+            Disease name.
+        evidence : list of str
+            List of supporting evidence strings.
+        llm_code : str
+            Initial ICD-10 code from LLM, or an empty string if there is
+            none, in which case the prediction is left out of the prompt.
+        llm_code_name : str
+            Name corresponding to llm_code.
+        retrieved_codes : list of dict
+            List of retrieved codes with similarity scores.
+        system_prompt : str, optional
+            Optional custom system prompt.
 
-        user_prompt = f"""Diagnosed disease:
-{disease}
+        Returns
+        -------
+        dict
+            Dictionary with 'Reranked ICD-10 Codes' list. If the request
+            failed, the list is empty and 'error' holds the error message.
+        """
+        if not retrieved_codes:
+            return {"Reranked ICD-10 Codes": []}
 
-Supporting evidence:
-{evidence_text}
+        try:
+            request = self._build_request(disease, evidence, llm_code,
+                                          llm_code_name, retrieved_codes,
+                                          system_prompt)
+            output_text = self.cache.get(request) if self.cache is not None else None
+            if output_text is None:
+                async with self._request_slot():
+                    if self.rate_limiter is not None:
+                        await self.rate_limiter.acquire()
+                    response = await self.async_client.responses.create(**request)
+                output_text = response.output_text
+                if self.cache is not None:
+                    self.cache.set(request, output_text)
+            return self._parse_response(output_text, retrieved_codes)
 
-LLM's initial ICD-10 prediction:
-  Code: {llm_code}
-  Name: {llm_code_name}
+        except Exception as e:
+            logger.error(f"Failed to rerank codes: {e}")
+            return {"Reranked ICD-10 Codes": [], "error": str(e)}
 
-Retrieved ICD-10 candidate codes (from semantic search):
-{"\n".join(retrieved_codes_formatted)}
+    def rerank_many(
+        self,
+        candidates: List[Dict[str, Any]],
+        system_prompt: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Re-rank the retrieved codes of several diseases in one request.
 
-Re-rank these codes based on how well they match the disease and evidence."""
+        This sends the system prompt once and makes a single round trip
+        instead of one per disease, at the cost of a longer response.
 
+        Parameters
+        ----------
+        candidates : list of dict
+            Arguments of rerank for each disease, i.e., 'disease',
+            'evidence', 'llm_code', 'llm_code_name' and 'retrieved_codes'.
+        system_prompt : str, optional
+            Optional custom system prompt.
+
+        Returns
+        -------
+        list of dict
+            Dictionary with 'Reranked ICD-10 Codes' list for each
+            candidate, in the order of the candidates, with 'error' if
+            its request failed.
+        """
+        results = [{"Reranked ICD-10 Codes": []} for _ in candidates]
+        positions = [idx for idx, candidate in enumerate(candidates)
+                     if candidate.get('retrieved_codes')]
+        if not positions:
+            return results
+
+        to_rerank = [candidates[idx] for idx in positions]
         try:
-            response = self.client.responses.create(
-                model=self.model,
-                input=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                text={
-                    "format": {
-                        "type": "json_schema",
-                        "name": "reranking_icd_10_codes",
-                        "schema": self.schema,
-                        "strict": True,
-                    }
-                },
-            )
-
-            response_json = json.loads(response.output_text)
-
-            # Validate structure
-            if 'Reranked ICD-10 Codes' not in response_json:
-                print("Warning: Invalid reranking response structure")
-                return {"Reranked ICD-10 Codes": []}
-
-            # Create mapping from code to similarity score from retrieved_codes
-            code_to_similarity = {}
-            for retrieved_code in retrieved_codes:
-                code = retrieved_code.get('code', '')
-                similarity = retrieved_code.get('similarity', 0.0)
-                if code:
-                    code_to_similarity[code] = similarity
-
-            # Validate codes and add similarity scores
-            validated_codes = []
-            for code_info in response_json['Reranked ICD-10 Codes']:
-                code = code_info.get('ICD-10 Code', '')
-                if validate_icd10_code(code):
-                    # Add similarity score from retrieved_codes if available
-                    similarity = code_to_similarity.get(code, 0.0)
-                    code_info['similarity'] = similarity
-                    validated_codes.append(code_info)
-                else:
-                    print(f"Warning: Invalid ICD-10 code '{code}' in reranking result")
-
-            return {"Reranked ICD-10 Codes": validated_codes}
-
-        except json.JSONDecodeError as e:
-            print(f"Error: Failed to parse reranking JSON response: {e}")
-            return {"Reranked ICD-10 Codes": []}
+            request = self._build_many_request(to_rerank, system_prompt)
+            output_text = self.cache.get(request) if self.cache is not None else None
+            if output_text is None:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.wait()
+                response = self.client.responses.create(**request)
+                output_text = response.output_text
+                if self.cache is not None:
+                    self.cache.set(request, output_text)
+            reranked = self._parse_many_response(output_text, to_rerank)
 
         except Exception as e:
-            print(f"Error: Failed to rerank codes: {e}")
+            logger.error(f"Failed to rerank codes: {e}")
+            for idx in positions:
+                results[idx] = {"Reranked ICD-10 Codes": [], "error": str(e)}
+            return results
+
+        for idx, result in zip(positions, reranked):
+            results[idx] = result
+        return results
+
+    async def arerank_many(
+        self,
+        candidates: List[Dict[str, Any]],
+        system_prompt: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Re-rank the retrieved codes of several diseases asynchronously.
+
+        Same as rerank_many, but sends the request with AsyncOpenAI.
+
+        Parameters
+        ----------
+        candidates : list of dict
+            Arguments of rerank for each disease, i.e., 'disease',
+            'evidence', 'llm_code', 'llm_code_name' and 'retrieved_codes'.
+        system_prompt : str, optional
+            Optional custom system prompt.
+
+        Returns
+        -------
+        list of dict
+            Dictionary with 'Reranked ICD-10 Codes' list for each
+            candidate, in the order of the candidates, with 'error' if
+            its request failed.
+        """
+        results = [{"Reranked ICD-10 Codes": []} for _ in candidates]
+        positions = [idx for idx, candidate in enumerate(candidates)
+                     if candidate.get('retrieved_codes')]
+        if not positions:
+            return results
+
+        to_rerank = [candidates[idx] for idx in positions]
+        try:
+            request = self._build_many_request(to_rerank, system_prompt)
+            output_text = self.cache.get(request) if self.cache is not None else None
+            if output_text is None:
+                async with self._request_slot():
+                    if self.rate_limiter is not None:
+                        await self.rate_limiter.acquire()
+                    response = await self.async_client.responses.create(**request)
+                output_text = response.output_text
+                if self.cache is not None:
+                    self.cache.set(request, output_text)
+            reranked = self._parse_many_response(output_text, to_rerank)
+
+        except Exception as e:
+            logger.error(f"Failed to rerank codes: {e}")
+            for idx in positions:
+                results[idx] = {"Reranked ICD-10 Codes": [], "error": str(e)}
+            return results
+
+        for idx, result in zip(positions, reranked):
+            results[idx] = result
+        return results
+
+    def submit_batch(
+        self,
+        candidates: List[Dict[str, Any]],
+        system_prompt: Optional[str] = None
+    ) -> str:
+        """Submit the re-ranking of several diseases as an OpenAI batch.
+
+        Parameters
+        ----------
+        candidates : list of dict
+            Arguments of rerank for each disease, i.e., 'disease',
+            'evidence', 'llm_code', 'llm_code_name' and 'retrieved_codes'.
+            Diseases without retrieved codes are not submitted.
+        system_prompt : str, optional
+            Optional custom system prompt.
+
+        Returns
+        -------
+        str
+            ID of the batch, to be passed to collect_batch.
+        """
+        requests = {
+            str(idx): self._build_request(system_prompt=system_prompt, **candidate)
+            for idx, candidate in enumerate(candidates)
+            if candidate.get('retrieved_codes')
+        }
+        return submit_batch(self.client, requests)
+
+    def collect_batch(
+        self,
+        batch_id: str,
+        candidates: List[Dict[str, Any]],
+        poll_interval: float = 60.0,
+        timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Wait for a re-ranking batch and parse its results.
+
+        Parameters
+        ----------
+        batch_id : str
+            ID of the batch returned by submit_batch.
+        candidates : list of dict
+            The candidates passed to submit_batch.
+        poll_interval : float
+            Time (seconds) between batch status checks. Defaults to 60.
+        timeout : float, optional
+            Maximum time (seconds) to wait for the batch.
+
+        Returns
+        -------
+        list of dict
+            Dictionary with 'Reranked ICD-10 Codes' list for each
+            candidate, in the order of the candidates, with 'error' if
+            its request failed.
+        """
+        batch = wait_for_batch(self.client, batch_id, poll_interval, timeout)
+        output_texts = get_batch_output_texts(self.client, batch)
+        results = []
+        for idx, candidate in enumerate(candidates):
+            if str(idx) in output_texts:
+                results.append(self._parse_response(output_texts[str(idx)],
+                                                    candidate['retrieved_codes']))
+            elif candidate.get('retrieved_codes'):
+                results.append({"Reranked ICD-10 Codes": [],
+                                "error": "Batch request failed"})
+            else:
+                results.append({"Reranked ICD-10 Codes": []})
+        return results
+
+    def _build_request(
+        self,
+        disease: str,
+        evidence: List[str],
+        llm_code: str,
+        llm_code_name: str,
+        retrieved_codes: List[Dict[str, Any]],
+        system_prompt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Build the arguments of the reranking responses.create call."""
+        if system_prompt is None:
+            system_prompt = _RERANKING_SYSTEM_PROMPT
+
+        user_prompt = (
+            _format_candidate(disease, evidence, llm_code, llm_code_name,
+                              retrieved_codes)
+            + "\n\nRe-rank these codes based on how well they match the disease and evidence."
+        )
+
+        return dict(
+            model=self.model,
+            input=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            text={
+                "format": {
+                    "type": "json_schema",
+                    "name": "reranking_icd_10_codes",
+                    "schema": self.schema,
+                    "strict": True,
+                }
+            },
+        )
+
+    def _build_many_request(
+        self,
+        candidates: List[Dict[str, Any]],
+        system_prompt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Build the arguments of a joint reranking responses.create call."""
+        if system_prompt is None:
+            system_prompt = _MULTI_RERANKING_SYSTEM_PROMPT
+
+        sections = [
+            f"=== Disease {idx} ===\n" + _format_candidate(**candidate)
+            for idx, candidate in enumerate(candidates, 1)
+        ]
+        user_prompt = (
+            "\n\n".join(sections)
+            + f"\n\nRe-rank the codes of each of these {len(candidates)} diseases "
+            "based on how well they match the disease and evidence."
+        )
+
+        return dict(
+            model=self.model,
+            input=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            text={
+                "format": {
+                    "type": "json_schema",
+                    "name": "reranking_icd_10_codes_many",
+                    "schema": MULTI_RERANKING_SCHEMA,
+                    "strict": True,
+                }
+            },
+        )
+
+    def _parse_response(
+        self,
+        output_text: str,
+        retrieved_codes: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Parse and validate the reranking response text."""
+        try:
+            response_json = orjson.loads(output_text)
+        except orjson.JSONDecodeError as e:
+            logger.error(f"Failed to parse reranking JSON response: {e}")
+            return {"Reranked ICD-10 Codes": []}
+
+        return self._validate_reranking(response_json, retrieved_codes)
+
+    def _parse_many_response(
+        self,
+        output_text: str,
+        candidates: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Parse and validate the joint reranking response text."""
+        try:
+            response_json = orjson.loads(output_text)
+        except orjson.JSONDecodeError as e:
+            logger.error(f"Failed to parse reranking JSON response: {e}")
+            return [{"Reranked ICD-10 Codes": []} for _ in candidates]
+
+        results = response_json.get('Results')
+        if not isinstance(results, list) or len(results) != len(candidates):
+            logger.warning("Invalid joint reranking response structure")
+            return [{"Reranked ICD-10 Codes": []} for _ in candidates]
+
+        return [
+            self._validate_reranking(result, candidate['retrieved_codes'])
+            for result, candidate in zip(results, candidates)
+        ]
+
+    def _validate_reranking(
+        self,
+        response_json: Dict[str, Any],
+        retrieved_codes: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Validate a reranking and add the similarities of its codes."""
+        # Validate structure
+        if 'Reranked ICD-10 Codes' not in response_json:
+            logger.warning("Invalid reranking response structure")
             return {"Reranked ICD-10 Codes": []}
 
+        # Create mapping from code to similarity score from retrieved_codes
+        code_to_similarity = {
+            retrieved_code['code']: retrieved_code.get('similarity', 0.0)
+            for retrieved_code in retrieved_codes
+            if retrieved_code.get('code')
+        }
+
+        # Validate codes and add similarity scores
+        validated_codes = []
+        for code_info in response_json['Reranked ICD-10 Codes']:
+            code = code_info.get('ICD-10 Code', '')
+            if validate_icd10_code(code):
+                # Add similarity score from retrieved_codes if available
+                similarity = code_to_similarity.get(code, 0.0)
+                code_info['similarity'] = similarity
+                validated_codes.append(code_info)
+            else:
+                logger.warning(f"Invalid ICD-10 code '{code}' in reranking result")
+
+        return {"Reranked ICD-10 Codes": validated_codes}
+
+
+def _format_candidate(
+    disease: str,
+    evidence: List[str],
+    llm_code: str,
+    llm_code_name: str,
+    retrieved_codes: List[Dict[str, Any]]
+) -> str:
+    """Format a disease and its retrieved codes for a reranking prompt.
+
+    The LLM's initial prediction is left out if llm_code is empty.
+    """
+    # Format retrieved codes with similarity scores
+    retrieved_codes_formatted = []
+    for code_info in retrieved_codes:
+        code = code_info.get('code', '')
+        name = code_info.get('name', '')
+        similarity = code_info.get('similarity', 0.0)
+        retrieved_codes_formatted.append(
+            f"  - Code: {code}, Name: {name}, Similarity: {similarity:.3f}"
+        )
+
+    evidence_text = "\n".join(f"  - {e}" for e in evidence) if evidence else "  (No specific evidence provided)"
+    # Joined outside of the f-string, backslashes in f-string
+    # expressions require Python 3.12
+    retrieved_codes_text = "\n".join(retrieved_codes_formatted)
+
+    llm_prediction_text = f"""LLM's initial ICD-10 prediction:
+  Code: {llm_code}
+  Name: {llm_code_name}
+
+""" if llm_code else ""
+
+    return f"""Diagnosed disease:
+{disease}
+
+Supporting evidence:
+{evidence_text}
+
+{llm_prediction_text}Retrieved ICD-10 candidate codes (from semantic search):
+{retrieved_codes_text}"""
@@ -2,13 +2,55 @@
 ICD-10 code retrieval using semantic embeddings.
 """
 
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+
 import numpy as np
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 
 from openacme.icd10.generate_embeddings import load_embeddings, get_code_index
 
+from coda import CODA_BASE
+
+logger = logging.getLogger(__name__)
+
+# Supported values for the index argument of ICD10Retriever
+INDEX_TYPES = {"flat", "hnsw"}
+
+# Number of neighbors per node and size of the candidate list used when
+# building HNSW indexes
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+
+# Default size of the candidate list when searching HNSW indexes
+DEFAULT_HNSW_EF_SEARCH = 64
+
+# Built HNSW indexes are stored here so that they are only built once
+INDEX_BASE = CODA_BASE.module("icd10_index")
+
+# Supported values for the precision argument of ICD10Retriever
+PRECISIONS = {"float32", "float16", "int8"}
+
+# Number of reduced precision code embeddings upcast at a time when scoring
+SCORE_BLOCK_SIZE = 8192
+
+# Number of distinct texts whose embeddings are cached
+DEFAULT_ENCODE_CACHE_SIZE = 1024
+
+# Supported values for the backend argument of ICD10Retriever
+BACKENDS = {"torch", "onnx", "openvino"}
+
+# Definition data of codes missing from the definitions, shared so that
+# building results doesn't allocate a new empty dict for every code
+_NO_DEFINITION = {}
+
 
 class ICD10Retriever:
     """
@@ -19,7 +61,18 @@ class ICD10Retriever:
 
     def __init__(
         self,
-        model_name: str = 'all-MiniLM-L6-v2'
+        model_name: str = 'all-MiniLM-L6-v2',
+        index: Optional[str] = None,
+        precision: str = "float32",
+        device: Optional[str] = None,
+        max_batch_size: int = 1,
+        batch_window: float = 0.005,
+        encode_cache_size: int = DEFAULT_ENCODE_CACHE_SIZE,
+        hnsw_ef_search: int = DEFAULT_HNSW_EF_SEARCH,
+        mmap: bool = False,
+        backend: str = "torch",
+        model_kwargs: Optional[Dict[str, Any]] = None,
+        num_threads: Optional[int] = None
     ):
         """Initialize ICD-10 retriever.
 
@@ -27,28 +80,136 @@ class ICD10Retriever:
         ----------
         model_name : str
             SentenceTransformer model name. Defaults to 'all-MiniLM-L6-v2'.
+        index : str, optional
+            Type of FAISS index used for search (requires faiss). "flat"
+            is an exhaustive inner product index using FAISS's SIMD and
+            multi-threaded kernels, exact unless precision is reduced.
+            "hnsw" is an approximate HNSW graph index, which only visits
+            a small fraction of the codes per query. It is built once and
+            stored in the coda data directory. Defaults to None, which
+            searches with a NumPy matrix-vector product.
+        precision : str
+            Precision in which code embeddings are stored for search.
+            "float16" uses 2x less memory than "float32". With "int8",
+            embeddings are scalar quantized with a scale per code, using
+            4x less memory. Both come at a small cost in similarity
+            accuracy. Defaults to "float32".
+        device : str, optional
+            Torch device to run the SentenceTransformer model on. Defaults
+            to None, in which case a GPU is used if available.
+        max_batch_size : int
+            Maximum number of texts encoded together. If larger than 1,
+            texts passed to retrieve concurrently (e.g., from several
+            threads) are collected and encoded in a single batch.
+            Defaults to 1.
+        batch_window : float
+            Time (seconds) to wait for more texts after the first one
+            before encoding a batch. Defaults to 0.005.
+        encode_cache_size : int
+            Maximum number of texts whose embeddings are cached by
+            retrieve. Set to 0 to disable caching. Defaults to 1024.
+        hnsw_ef_search : int
+            Size of the candidate list when searching an "hnsw" index.
+            Larger values improve recall at the cost of speed. Defaults
+            to 64.
+        mmap : bool
+            If True, the code embeddings used for search are stored in the
+            coda data directory and memory-mapped, so that processes using
+            the same embeddings (e.g., several server workers) share a
+            single copy in the OS page cache. Defaults to False.
+        backend : str
+            Backend used by the SentenceTransformer model to encode
+            queries, "torch", "onnx" or "openvino". ONNX Runtime is
+            usually considerably faster than torch on CPU (requires
+            optimum[onnxruntime]). Other backends than "torch" require
+            sentence-transformers>=3.2, see the onnx extra. Defaults to
+            "torch".
+        model_kwargs : dict, optional
+            Additional keyword arguments for loading the model, e.g.,
+            {"file_name": "onnx/model_qint8_avx512_vnni.onnx"} to use
+            a dynamically int8 quantized ONNX export of the model. Note
+            that quantized models encode queries slightly differently
+            from the model the code embeddings were computed with.
+        num_threads : int, optional
+            Number of threads used by torch to encode queries on CPU and,
+            with an index, by FAISS to search. Note that these are
+            process-wide settings. Defaults to None, which keeps the
+            libraries' defaults.
         """
+        if index is not None and index not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index type: {index}")
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unsupported precision: {precision}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unsupported backend: {backend}")
+        if num_threads is not None:
+            _set_num_threads(num_threads, faiss_threads=index is not None)
         embeddings, definitions_data = load_embeddings()
-        self.embeddings = embeddings
+        # Normalize the embeddings once so that cosine similarity with a
+        # normalized query is a single matrix-vector product
+        embeddings = _normalize_rows(embeddings)
+        self.precision = precision
+        if precision == "int8":
+            self.embeddings, self.embedding_scales = _quantize_int8(embeddings)
+        elif precision == "float16":
+            self.embeddings = embeddings.astype(np.float16)
+            self.embedding_scales = None
+        else:
+            # Stored column-major so that the transposed matrix used in
+            # _similarities is contiguous, which makes the products of
+            # several queries considerably faster
+            self.embeddings = np.asfortranarray(embeddings)
+            self.embedding_scales = None
+        if mmap:
+            self.embeddings = _memory_map(self.embeddings, embeddings)
         self.definitions_data = definitions_data
         # Generate code index using openacme's helper function
         self.code_index = get_code_index(definitions_data)
+        # Array of fixed-width strings, so that the codes of all results
+        # are gathered with a single indexing operation
+        self.idx_to_code = np.array(list(self.code_index['idx_to_code']))
+        if index == "hnsw":
+            self._index = _load_or_build_hnsw_index(embeddings, precision)
+            self._index.hnsw.efSearch = hnsw_ef_search
+        elif index == "flat":
+            self._index = _build_faiss_index(embeddings, precision)
+        else:
+            self._index = None
         self.model_name = model_name
+        self.device = device
+        self.backend = backend
+        self.model_kwargs = model_kwargs
         self._model = None
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self._batch_queue = queue.Queue()
+        self._batch_worker = None
+        self._batch_lock = threading.Lock()
+        self._encode_cached = lru_cache(maxsize=encode_cache_size)(self._encode)
 
     @property
     def model(self) -> SentenceTransformer:
         """Lazy load the SentenceTransformer model."""
         if self._model is None:
-            print(f"Loading SentenceTransformer model: {self.model_name}")
-            self._model = SentenceTransformer(self.model_name)
+            logger.info("Loading SentenceTransformer model: %s (%s backend)",
+                        self.model_name, self.backend)
+            kwargs = {}
+            # Only passed if set, as they need sentence-transformers>=3.2
+            if self.backend != "torch":
+                kwargs["backend"] = self.backend
+            if self.model_kwargs is not None:
+                kwargs["model_kwargs"] = self.model_kwargs
+            self._model = SentenceTransformer(self.model_name,
+                                              device=self.device,
+                                              **kwargs)
         return self._model
 
     def retrieve(
         self,
         clinical_text: str,
         top_k: int = 10,
-        min_similarity: float = 0.0
+        min_similarity: float = 0.0,
+        include_definition: bool = False
     ) -> List[Dict[str, Any]]:
         """Retrieve top-k most similar ICD-10 codes for clinical text.
 
@@ -60,48 +221,213 @@ class ICD10Retriever:
             Number of top codes to return. Defaults to 10.
         min_similarity : float
             Minimum similarity threshold (0.0 to 1.0). Defaults to 0.0.
+        include_definition : bool
+            If True, results also include the definition of each code.
+            Definitions can be long and aren't used by the pipeline, so
+            they are left out by default. Defaults to False.
 
         Returns
         -------
         list of dict
-            List of dictionaries with code, similarity, name, and definition.
+            List of dictionaries with code, similarity, name, and, if
+            requested, definition.
         """
         if not clinical_text or not clinical_text.strip():
             return []
 
         # Generate embedding for clinical text
-        clinical_embedding = self.model.encode(
+        clinical_embedding = self._encode_cached(clinical_text)
+
+        [(indices, similarities)] = self._search(
+            np.asarray(clinical_embedding, dtype=np.float32)[np.newaxis],
+            top_k,
+            min_similarity
+        )
+        return self._build_results(indices, similarities, include_definition)
+
+    def retrieve_batch(
+        self,
+        clinical_texts: List[str],
+        top_k: int = 10,
+        min_similarity: float = 0.0,
+        batch_size: int = 64,
+        include_definition: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """Retrieve top-k most similar ICD-10 codes for several texts.
+
+        All texts are encoded together and scored against the code
+        embeddings with a single matrix product, which is considerably
+        faster than calling retrieve for each text.
+
+        Parameters
+        ----------
+        clinical_texts : list of str
+            Clinical descriptions or evidence texts.
+        top_k : int
+            Number of top codes to return per text. Defaults to 10.
+        min_similarity : float
+            Minimum similarity threshold (0.0 to 1.0). Defaults to 0.0.
+        batch_size : int
+            Batch size used to encode the texts. Defaults to 64.
+        include_definition : bool
+            If True, results also include the definition of each code.
+            Defaults to False.
+
+        Returns
+        -------
+        list of list of dict
+            For each input text, in order, the list of dictionaries with
+            code, similarity, name, and, if requested, definition. Empty
+            texts get an empty list.
+        """
+        results = [[] for _ in clinical_texts]
+        positions = [i for i, text in enumerate(clinical_texts)
+                     if text and text.strip()]
+        if not positions:
+            return results
+
+        clinical_embeddings = self.model.encode(
+            [clinical_texts[i] for i in positions],
+            batch_size=batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True
+        )
+        matches = self._search(
+            np.asarray(clinical_embeddings, dtype=np.float32),
+            top_k,
+            min_similarity
+        )
+        for i, (indices, similarities) in zip(positions, matches):
+            results[i] = self._build_results(indices, similarities,
+                                             include_definition)
+        return results
+
+    def _encode(self, clinical_text: str) -> np.ndarray:
+        """Encode a text into a normalized embedding."""
+        if self.max_batch_size > 1:
+            return self._submit_for_batch(clinical_text)
+        return self.model.encode(
             [clinical_text],
             normalize_embeddings=True
-        )
+        )[0]
 
-        # Calculate cosine similarity
-        similarities = cosine_similarity(clinical_embedding, self.embeddings)[0]
+    def _submit_for_batch(self, clinical_text: str) -> np.ndarray:
+        """Queue a text for batched encoding and wait for its embedding."""
+        with self._batch_lock:
+            if self._batch_worker is None:
+                self._batch_worker = threading.Thread(
+                    target=self._run_batches, daemon=True
+                )
+                self._batch_worker.start()
+        future = Future()
+        self._batch_queue.put((clinical_text, future))
+        return future.result()
 
-        # Filter by minimum similarity
-        valid_indices = np.where(similarities >= min_similarity)[0]
+    def _run_batches(self):
+        """Collect queued texts into batches and encode them."""
+        while True:
+            batch = [self._batch_queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._batch_queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                embeddings = self.model.encode(
+                    [text for text, _ in batch],
+                    batch_size=len(batch),
+                    normalize_embeddings=True,
+                    convert_to_numpy=True
+                )
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), embedding in zip(batch, embeddings):
+                    future.set_result(embedding)
 
-        if len(valid_indices) == 0:
-            return []
+    def _search(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        min_similarity: float
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Find the codes most similar to normalized query embeddings.
 
-        # Get top-k most similar codes
-        top_indices = similarities[valid_indices].argsort()[-top_k:][::-1]
-        top_indices = valid_indices[top_indices]
+        Parameters
+        ----------
+        queries : numpy.ndarray
+            Normalized query embeddings, one per row.
 
+        Returns
+        -------
+        list of tuple of numpy.ndarray
+            For each query, indices of the top-k codes at or above
+            min_similarity and their cosine similarities, in order of
+            decreasing similarity.
+        """
+        if self._index is not None:
+            k = min(top_k, self._index.ntotal)
+            if k <= 0:
+                return [(np.empty(0, dtype=np.intp),
+                         np.empty(0, dtype=np.float32))
+                        for _ in range(len(queries))]
+            similarities, indices = self._index.search(queries, k)
+            keep = (indices >= 0) & (similarities >= min_similarity)
+            return [(idx[mask], sims[mask])
+                    for idx, sims, mask in zip(indices, similarities, keep)]
+
+        similarities = self._similarities(queries)
+        indices = _top_k_indices(similarities, top_k)
+        similarities = np.take_along_axis(similarities, indices, axis=1)
+        keep = similarities >= min_similarity
+        return [(idx[mask], sims[mask])
+                for idx, sims, mask in zip(indices, similarities, keep)]
+
+    def _similarities(self, queries: np.ndarray) -> np.ndarray:
+        """Compute cosine similarities of queries with all code embeddings."""
+        if self.embeddings.dtype == np.float32:
+            # Calculate cosine similarities of all queries with one product
+            return queries @ self.embeddings.T
+        # NumPy has no fast float16 or int8 matrix product, so reduced
+        # precision embeddings are upcast one block at a time, which
+        # bounds the extra memory
+        num_codes = len(self.embeddings)
+        similarities = np.empty((len(queries), num_codes), dtype=np.float32)
+        for start in range(0, num_codes, SCORE_BLOCK_SIZE):
+            block = self.embeddings[start:start + SCORE_BLOCK_SIZE]
+            similarities[:, start:start + SCORE_BLOCK_SIZE] = (
+                queries @ block.T.astype(np.float32)
+            )
+        if self.embedding_scales is not None:
+            similarities *= self.embedding_scales
+        return similarities
+
+    def _build_results(
+        self,
+        indices: np.ndarray,
+        similarities: np.ndarray,
+        include_definition: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Build result dicts for the given code indices and similarities."""
         results = []
-        for idx in top_indices:
-            # get_code_index returns idx_to_code as a list, not a dict
-            code = self.code_index['idx_to_code'][idx]
-            similarity = float(similarities[idx])
-            name = self.definitions_data.get(code, {}).get('name', f'Code: {code}')
-            definition = self.definitions_data.get(code, {}).get('definition', '')
-
-            results.append({
+        codes = self.idx_to_code[indices].tolist()
+        for code, similarity in zip(codes, similarities.tolist()):
+            code_data = self.definitions_data.get(code, _NO_DEFINITION)
+            name = code_data.get('name', f'Code: {code}')
+
+            result = {
                 'code': code,
                 'similarity': similarity,
-                'name': name,
-                'definition': definition
-            })
+                'name': name
+            }
+            if include_definition:
+                result['definition'] = code_data.get('definition', '')
+            results.append(result)
 
         return results
 
@@ -139,3 +465,128 @@ class ICD10Retriever:
             return ""
         return self.definitions_data[code].get('definition', '')
 
+
+def _set_num_threads(num_threads: int, faiss_threads: bool = False):
+    """Set the number of threads used by torch and optionally FAISS."""
+    import torch
+
+    torch.set_num_threads(num_threads)
+    if faiss_threads:
+        import faiss
+
+        faiss.omp_set_num_threads(num_threads)
+
+
+def _normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    """Return a float32 copy of the embeddings with unit-norm rows."""
+    embeddings = np.array(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings /= np.maximum(norms, 1e-12)
+    return embeddings
+
+
+def _quantize_int8(embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantize embeddings to int8 with a scale per row.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        The int8 embeddings and the float32 scales such that
+        embeddings ~= quantized * scales[:, None].
+    """
+    scales = np.abs(embeddings).max(axis=1) / 127.0
+    scales = np.maximum(scales, 1e-12).astype(np.float32)
+    quantized = np.round(embeddings / scales[:, np.newaxis]).astype(np.int8)
+    return quantized, scales
+
+
+def _build_faiss_index(
+    embeddings: np.ndarray,
+    precision: str,
+    index_type: str = "flat"
+):
+    """Build a FAISS inner product index over normalized embeddings."""
+    import faiss
+
+    dim = embeddings.shape[1]
+    quantizer_types = {
+        "float16": faiss.ScalarQuantizer.QT_fp16,
+        "int8": faiss.ScalarQuantizer.QT_8bit,
+    }
+    if index_type == "hnsw":
+        if precision in quantizer_types:
+            index = faiss.IndexHNSWSQ(dim, quantizer_types[precision],
+                                      HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexHNSWFlat(dim, HNSW_M,
+                                        faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif precision in quantizer_types:
+        index = faiss.IndexScalarQuantizer(
+            dim, quantizer_types[precision], faiss.METRIC_INNER_PRODUCT
+        )
+    else:
+        index = faiss.IndexFlatIP(dim)
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+    return index
+
+
+def _load_or_build_hnsw_index(embeddings: np.ndarray, precision: str):
+    """Load a stored HNSW index of the embeddings, or build and store it.
+
+    Building the graph takes much longer than loading it. Stored indexes
+    are identified by a hash of the embeddings, so that they are rebuilt
+    when the embeddings change.
+    """
+    import faiss
+
+    path = INDEX_BASE.join(
+        name=f"hnsw{HNSW_M}_{precision}_{_fingerprint(embeddings)}.faiss"
+    )
+    if path.exists():
+        return faiss.read_index(str(path))
+    index = _build_faiss_index(embeddings, precision, index_type="hnsw")
+    faiss.write_index(index, str(path))
+    return index
+
+
+def _memory_map(array: np.ndarray, embeddings: np.ndarray) -> np.ndarray:
+    """Return a read-only memory map of an array derived from embeddings.
+
+    The array is saved in the coda data directory the first time, under a
+    name identifying the embeddings it was derived from.
+    """
+    order = "F" if np.isfortran(array) else "C"
+    path = INDEX_BASE.join(
+        name=f"embeddings_{array.dtype}_{order}_{_fingerprint(embeddings)}.npy"
+    )
+    if not path.exists():
+        # Write to a temporary file first so that other processes never
+        # map a partially written file
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as fh:
+            np.save(fh, array)
+        os.replace(tmp_path, path)
+    return np.load(path, mmap_mode="r")
+
+
+def _fingerprint(embeddings: np.ndarray) -> str:
+    """Return a short hash identifying the content of embeddings."""
+    return hashlib.sha256(embeddings.tobytes()).hexdigest()[:16]
+
+
+def _top_k_indices(similarities: np.ndarray, top_k: int) -> np.ndarray:
+    """Return indices of the top-k similarities of each row.
+
+    Indices are ordered by decreasing similarity. Only the top-k entries
+    of each row are sorted, the rest are just partitioned off, and all
+    rows are handled in single NumPy calls.
+    """
+    k = min(top_k, similarities.shape[1])
+    if k <= 0:
+        return np.empty((len(similarities), 0), dtype=np.intp)
+    top = np.argpartition(similarities, -k, axis=1)[:, -k:]
+    order = np.argsort(-np.take_along_axis(similarities, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
@@ -37,6 +37,30 @@ DISEASE_EXTRACTION_SCHEMA = {
     "additionalProperties": False
 }
 
+# Extraction schema without the LLM's ICD-10 codes, for when codes are
+# only chosen by re-ranking the retrieved codes
+_DISEASE_PROPERTIES = DISEASE_EXTRACTION_SCHEMA["properties"]["Diseases"]["items"]["properties"]
+DISEASE_EXTRACTION_WITHOUT_CODES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "Diseases": {
+            "type": "array",
+            "description": "The diseases or conditions that the patient likely has.",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "Disease": _DISEASE_PROPERTIES["Disease"],
+                    "Supporting Evidence": _DISEASE_PROPERTIES["Supporting Evidence"],
+                },
+                "required": ["Disease", "Supporting Evidence"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["Diseases"],
+    "additionalProperties": False
+}
+
 RERANKING_SCHEMA = {
     "type": "object",
     "properties": {
@@ -64,6 +88,19 @@ RERANKING_SCHEMA = {
     "additionalProperties": False,
 }
 
+MULTI_RERANKING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "Results": {
+            "type": "array",
+            "description": "The re-ranking of each disease, in the order in which the diseases are given.",
+            "items": RERANKING_SCHEMA,
+        },
+    },
+    "required": ["Results"],
+    "additionalProperties": False,
+}
+
 # Type hints for better IDE support
 # Note: TypedDict doesn't support keys with spaces, so we use Dict[str, Any] instead
 from typing import Dict, Any, List
@@ -3,12 +3,20 @@ Utility functions for validation and data processing.
 """
 
 import re
+from functools import lru_cache
 from typing import Optional, Dict, Any
 from pathlib import Path
-import json
+import orjson
 
 from openacme.icd10.generate_embeddings import EMBEDDINGS_BASE
 
+# Pattern: Letter followed by 2 digits, optionally followed by . and 1-4 digits
+ICD10_CODE_PATTERN = re.compile(r'[A-Z][0-9]{2}(?:\.[0-9]{1,4})?')
+
+# Length of the longest codes accepted by the pattern (3 characters, the
+# dot and 4 digits), checked before running the pattern
+ICD10_CODE_MAX_LENGTH = 8
+
 
 def validate_icd10_code(code: str) -> bool:
     """Validate ICD-10 code format.
@@ -25,9 +33,10 @@ def validate_icd10_code(code: str) -> bool:
     """
     if not code or not isinstance(code, str):
         return False
-    # Pattern: Letter followed by 2 digits, optionally followed by . and more digits
-    pattern = r'^[A-Z][0-9]{2}(\.[0-9]+)?$'
-    return bool(re.match(pattern, code))
+    # Rejects most malformed codes without running the pattern
+    if not 3 <= len(code) <= ICD10_CODE_MAX_LENGTH:
+        return False
+    return ICD10_CODE_PATTERN.fullmatch(code) is not None
 
 
 def load_icd10_definitions(definitions_file: Optional[Path] = None) -> Dict[str, Any]:
@@ -52,8 +61,14 @@ def load_icd10_definitions(definitions_file: Optional[Path] = None) -> Dict[str,
     if not definitions_file.exists():
         raise FileNotFoundError(f"Definitions file not found: {definitions_file}")
 
-    with open(definitions_file, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    with open(definitions_file, 'rb') as f:
+        return orjson.loads(f.read())
+
+
+@lru_cache(maxsize=1)
+def _load_default_icd10_definitions() -> Dict[str, Any]:
+    """Load the default ICD-10 definitions once per process."""
+    return load_icd10_definitions()
 
 
 def get_icd10_name(code: str, definitions_data: Optional[Dict[str, Any]] = None) -> str:
@@ -64,8 +79,9 @@ def get_icd10_name(code: str, definitions_data: Optional[Dict[str, Any]] = None)
     code : str
         ICD-10 code.
     definitions_data : dict, optional
-        Optional pre-loaded definitions dict. If None, loads definitions
-        from default location.
+        Optional pre-loaded definitions dict. If None, uses the definitions
+        from the default location, which are loaded on the first call and
+        reused by later ones.
 
     Returns
     -------
@@ -73,7 +89,7 @@ def get_icd10_name(code: str, definitions_data: Optional[Dict[str, Any]] = None)
         Code name, or error message if code not found.
     """
     if definitions_data is None:
-        definitions_data = load_icd10_definitions()
+        definitions_data = _load_default_icd10_definitions()
 
     if code not in definitions_data:
         return f"Unknown code: {code}"
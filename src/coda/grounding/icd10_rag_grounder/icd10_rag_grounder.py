@@ -6,7 +6,10 @@ diseases from clinical text and assign ICD-10 codes.
 """
 
 import logging
-from typing import List, Optional, Dict, Any
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Union
 
 from .. import BaseGrounder
 from .icd10_rag_extraction.pipeline import MedCoderPipeline
@@ -18,6 +21,9 @@ logger = logging.getLogger(__name__)
 from gilda import ScoredMatch, Annotation, Term
 from gilda.scorer import Match
 
+# Number of distinct texts whose grounding and annotation results are cached
+DEFAULT_CACHE_SIZE = 4096
+
 
 class RAGGrounder(BaseGrounder):
     """
@@ -33,7 +39,10 @@ class RAGGrounder(BaseGrounder):
         openai_model: str = "gpt-4o-mini",
         retrieval_top_k: int = 10,
         retrieval_min_similarity: float = 0.0,
-        annotation_min_similarity: float = 0.5
+        annotation_min_similarity: float = 0.5,
+        retrieval_precision: str = "float32",
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        cache_responses: Union[bool, str] = False
     ):
         """Initialize the RAG grounder.
 
@@ -49,6 +58,18 @@ class RAGGrounder(BaseGrounder):
             Minimum similarity threshold for retrieval. Defaults to 0.0.
         annotation_min_similarity : float
             Minimum similarity threshold for evidence annotation. Defaults to 0.5.
+        retrieval_precision : str
+            Precision in which code embeddings are stored for retrieval,
+            "float32", "float16" or "int8". Defaults to "float32".
+        cache_size : int
+            Maximum number of texts for which results of ground and annotate
+            are cached, so repeated texts, e.g., in re-runs and retries,
+            skip the pipeline and its LLM calls. Set to 0 to disable
+            caching. Defaults to 4096.
+        cache_responses : bool or str
+            Cache LLM responses of the pipeline, True or "disk" to persist
+            them across runs (requires diskcache), "memory" for this
+            process only. See MedCoderPipeline. Defaults to False.
 
         Notes
         -----
@@ -60,9 +81,17 @@ class RAGGrounder(BaseGrounder):
             openai_api_key=openai_api_key,
             openai_model=openai_model,
             retrieval_top_k=retrieval_top_k,
-            retrieval_min_similarity=retrieval_min_similarity
+            retrieval_min_similarity=retrieval_min_similarity,
+            retrieval_precision=retrieval_precision,
+            cache_responses=cache_responses
         )
         self.annotation_min_similarity = annotation_min_similarity
+        self.cache_size = cache_size
+        # Results are keyed by text and whether they are annotations, the
+        # pipeline configuration is fixed for the lifetime of the grounder
+        self._results = OrderedDict()
+        # Grounders are called from several threads, e.g., by the server
+        self._results_lock = threading.Lock()
 
     def ground(self, text: str) -> List:
         """Ground text to ICD-10 codes.
@@ -78,54 +107,34 @@ class RAGGrounder(BaseGrounder):
             List of gilda ScoredMatch objects.
         """
         logger.debug(f"Grounding text: {text[:100]}...")
+        return self.ground_batch([text])[0]
 
-        # Process through pipeline
-        result = self.pipeline.process(
-            text,
-            annotate_evidence=False,
-            annotation_min_similarity=self.annotation_min_similarity
-        )
-
-        # Extract all codes from the result
-        scored_matches = []
-        diseases = result.get('Diseases', [])
-
-        for disease in diseases:
-            # Get reranked codes - take only the top (first) code
-            codes = disease.get('reranked_codes', [])
-            if not codes:
-                continue
-
-            # Get the top code (first in reranked list)
-            code_info = codes[0]
-            code = code_info.get('ICD-10 Code', '') or code_info.get('code', '')
-            name = code_info.get('ICD-10 Name', '') or code_info.get('name', get_icd10_name(code))
-            # Use similarity score from retrieval
-            similarity = code_info.get('similarity', 0.0)
-            score = float(similarity)
-
-            # Create gilda Term object
-            term = Term(
-                norm_text=name.lower(),
-                text=name,
-                db="ICD10",
-                id=code,
-                entry_name=name,
-                status="name",
-                source="ICD10"
-            )
-
-            # Create gilda Match object (minimal - just query and ref)
-            match = Match(query=name, ref=name)
+    def ground_batch(
+        self,
+        texts: List[str],
+        use_batch_api: bool = False
+    ) -> List[List]:
+        """Ground several texts to ICD-10 codes.
 
-            # Create gilda ScoredMatch
-            scored_matches.append(
-                ScoredMatch(term=term, score=max(0.0, min(1.0, score)), match=match)
-            )
+        The texts are processed concurrently by the pipeline, so that
+        their LLM requests overlap, rather than one after the other.
 
-        logger.debug(f"Found {len(scored_matches)} scored matches")
+        Parameters
+        ----------
+        texts : list of str
+            Clinical texts to ground.
+        use_batch_api : bool
+            If True, the LLM requests are sent through the OpenAI Batch
+            API, which costs less but can take up to 24 hours, for bulk
+            offline jobs. Defaults to False.
 
-        return scored_matches
+        Returns
+        -------
+        list of list
+            List of gilda ScoredMatch objects for each text, in order.
+        """
+        return self._cached_process(texts, annotate_evidence=False,
+                                    use_batch_api=use_batch_api)
 
     def annotate(self, text: str) -> List:
         """Annotate text with ICD-10 codes and evidence spans.
@@ -141,65 +150,192 @@ class RAGGrounder(BaseGrounder):
             List of gilda Annotation objects.
         """
         logger.debug(f"Annotating text: {text[:100]}...")
+        return self.annotate_batch([text])[0]
+
+    def annotate_batch(
+        self,
+        texts: List[str],
+        use_batch_api: bool = False
+    ) -> List[List]:
+        """Annotate several texts with ICD-10 codes and evidence spans.
+
+        The texts are processed concurrently by the pipeline, so that
+        their LLM requests overlap, rather than one after the other.
+
+        Parameters
+        ----------
+        texts : list of str
+            Clinical texts to annotate.
+        use_batch_api : bool
+            If True, the LLM requests are sent through the OpenAI Batch
+            API, which costs less but can take up to 24 hours, for bulk
+            offline jobs. Defaults to False.
+
+        Returns
+        -------
+        list of list
+            List of gilda Annotation objects for each text, in order.
+        """
+        return self._cached_process(texts, annotate_evidence=True,
+                                    use_batch_api=use_batch_api)
 
-        # Process through pipeline with evidence annotation
-        result = self.pipeline.process(
-            text,
-            annotate_evidence=True,
+    def _cached_process(
+        self,
+        texts: List[str],
+        annotate_evidence: bool,
+        use_batch_api: bool
+    ) -> List[List]:
+        """Return matches or annotations of texts, processing uncached ones."""
+        keys = [(text, annotate_evidence) for text in texts]
+        with self._results_lock:
+            results = {key: self._results[key] for key in keys
+                       if key in self._results}
+        missing = [text for text, _ in dict.fromkeys(keys)
+                   if (text, annotate_evidence) not in results]
+        # Results of failed LLM requests, e.g., timeouts, aren't cached so
+        # that the texts are processed again once the API recovers
+        failed = set()
+        if missing:
+            convert = _annotations if annotate_evidence else _scored_matches
+            processed = self._process(missing,
+                                      annotate_evidence=annotate_evidence,
+                                      use_batch_api=use_batch_api)
+            for text, result in zip(missing, processed):
+                results[(text, annotate_evidence)] = tuple(convert(result))
+                if _failed(result):
+                    failed.add((text, annotate_evidence))
+        if self.cache_size > 0:
+            with self._results_lock:
+                for key in keys:
+                    if key in failed:
+                        continue
+                    self._results[key] = results[key]
+                    self._results.move_to_end(key)
+                while len(self._results) > self.cache_size:
+                    self._results.popitem(last=False)
+        # Return copies so callers can't modify the cached results
+        return [list(results[key]) for key in keys]
+
+    def _process(
+        self,
+        texts: List[str],
+        annotate_evidence: bool,
+        use_batch_api: bool
+    ) -> List[Dict[str, Any]]:
+        """Process texts through the pipeline."""
+        if use_batch_api:
+            return self.pipeline.process_batch_api(
+                texts,
+                annotate_evidence=annotate_evidence,
+                annotation_min_similarity=self.annotation_min_similarity
+            )
+        return self.pipeline.process(
+            list(texts),
+            annotate_evidence=annotate_evidence,
             annotation_min_similarity=self.annotation_min_similarity
         )
 
-        annotations = []
-        diseases = result.get('Diseases', [])
-
-        for disease in diseases:
-            # Get evidence spans (primary source for annotation text)
-            evidence_spans = disease.get('evidence_spans', [])
-            if not evidence_spans:
-                continue
-
-            # Get reranked codes - take only the top (first) code
-            codes = disease.get('reranked_codes', [])
-            if not codes:
-                codes = disease.get('retrieved_codes', [])
-            if not codes:
-                continue
-
-            # Get the top code (first in reranked list)
-            code_info = codes[0]
-            code = code_info.get('ICD-10 Code', '')
-            name = code_info.get('ICD-10 Name', '')
-            # Use similarity score from retrieval
-            similarity = code_info.get('similarity', 0.0)
-            score = float(similarity)
-
-            # Create gilda Term object
-            term = Term(
-                norm_text=name.lower(),
-                text=name,
-                db="ICD10",
-                id=code,
-                entry_name=name,
-                status="name",
-                source="ICD10"
-            )
 
-            # Create gilda Match object (minimal - just query and ref)
-            match = Match(query=name, ref=name)
+def _failed(result: Dict[str, Any]) -> bool:
+    """Return True if an LLM request of a pipeline result failed."""
+    return 'error' in result or any(
+        'error' in disease for disease in result.get('Diseases', [])
+    )
+
+
+def _scored_matches(result: Dict[str, Any]) -> List[ScoredMatch]:
+    """Create a ScoredMatch for the top code of each disease of a result."""
+    # Extract all codes from the result
+    scored_matches = []
+    diseases = result.get('Diseases', [])
+
+    for disease in diseases:
+        # Get reranked codes - take only the top (first) code
+        codes = disease.get('reranked_codes', [])
+        if not codes:
+            continue
+
+        # Get the top code (first in reranked list)
+        scored_matches.append(_scored_match(codes[0]))
+
+    logger.debug(f"Found {len(scored_matches)} scored matches")
 
-            # Create single ScoredMatch for the top code
-            top_match = ScoredMatch(term=term, score=max(0.0, min(1.0, score)), match=match)
+    return scored_matches
 
-            # Create one annotation per evidence span, each with the top code
-            for span in evidence_spans:
-                span_text = span.get('text', '')
-                start = span.get('start', 0)
-                end = span.get('end', len(span_text))
-                if span_text:
-                    annotations.append(
-                        Annotation(text=span_text, matches=[top_match], start=start, end=end)
-                    )
 
-        logger.debug(f"Created {len(annotations)} annotations")
+def _annotations(result: Dict[str, Any]) -> List[Annotation]:
+    """Create Annotations for the evidence spans of the diseases of a result."""
+    annotations = []
+    diseases = result.get('Diseases', [])
 
-        return annotations
+    for disease in diseases:
+        # Get evidence spans (primary source for annotation text)
+        evidence_spans = disease.get('evidence_spans', [])
+        if not evidence_spans:
+            continue
+
+        # Get reranked codes - take only the top (first) code
+        codes = disease.get('reranked_codes', [])
+        if not codes:
+            codes = disease.get('retrieved_codes', [])
+        if not codes:
+            continue
+
+        # Create single ScoredMatch for the top code
+        top_match = _scored_match(codes[0])
+
+        # Create one annotation per evidence span, each with the top code
+        for span in evidence_spans:
+            span_text = span.get('text', '')
+            start = span.get('start', 0)
+            end = span.get('end', len(span_text))
+            if span_text:
+                annotations.append(
+                    Annotation(text=span_text, matches=[top_match], start=start, end=end)
+                )
+
+    logger.debug(f"Created {len(annotations)} annotations")
+
+    return annotations
+
+
+def _scored_match(code_info: Dict[str, Any]) -> ScoredMatch:
+    """Create a gilda ScoredMatch for a re-ranked or retrieved code.
+
+    Re-ranked codes have 'ICD-10 Code' and 'ICD-10 Name' keys, whereas
+    retrieved codes have 'code' and 'name' keys. The name is only looked
+    up in the ICD-10 definitions if neither is available.
+    """
+    code = code_info.get('ICD-10 Code') or code_info.get('code', '')
+    name = code_info.get('ICD-10 Name') or code_info.get('name') or ''
+    term = _term_for_code(code, name)
+    # Use similarity score from retrieval
+    score = float(code_info.get('similarity', 0.0))
+    return ScoredMatch(term=term, score=max(0.0, min(1.0, score)),
+                       match=_match_for_name(term.entry_name))
+
+
+@lru_cache(maxsize=100_000)
+def _term_for_code(code: str, name: str) -> Term:
+    """Return the gilda Term of an ICD-10 code.
+
+    Codes come from a fixed vocabulary, so Terms are shared by all matches
+    of the same code and name instead of being created for each match. If
+    the name is empty, it is looked up in the ICD-10 definitions.
+    """
+    name = name or get_icd10_name(code)
+    return Term(
+        norm_text=name.lower(),
+        text=name,
+        db="ICD10",
+        id=code,
+        entry_name=name,
+        status="name",
+        source="ICD10"
+    )
+
+
+@lru_cache(maxsize=100_000)
+def _match_for_name(name: str) -> Match:
+    """Return a minimal gilda Match (just query and ref) for a code name."""
+    return Match(query=name, ref=name)
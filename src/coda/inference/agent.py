@@ -14,12 +14,25 @@ class InferenceAgent:
     def __init__(self):
         """Initialize the agent with empty dialogue history."""
         self.dialogue_history = []  # List of (chunk_id, timestamp, text, annotations) tuples
-        self.all_text = ""  # Accumulated text from all chunks
+        self._text_parts = []  # Text of each chunk, joined into all_text
+        self._all_text = ""  # Joined text, None when new chunks were added
+
+    @property
+    def all_text(self) -> str:
+        """Accumulated text from all chunks, each preceded by a space.
+
+        Chunk texts are collected in a list and only joined when read,
+        instead of copying the whole accumulated text on every chunk.
+        """
+        if self._all_text is None:
+            self._all_text = "".join(" " + part for part in self._text_parts)
+        return self._all_text
 
     def reset(self):
         """Reset dialogue history for a new interview."""
         self.dialogue_history = []
-        self.all_text = ""
+        self._text_parts = []
+        self._all_text = ""
         logger.info("Agent state reset for new interview")
 
     async def process_chunk(self, chunk_id: str, text: str,
@@ -56,7 +69,8 @@ class InferenceAgent:
 
         # Add to dialogue history
         self.dialogue_history.append((chunk_id, timestamp, text, annotations))
-        self.all_text += " " + text
+        self._text_parts.append(text)
+        self._all_text = None
 
         # Call subclass inference implementation
         result = await self.infer(chunk_id, text, annotations)
@@ -221,7 +235,8 @@ class InferenceServer:
         """Start the inference server."""
         import uvicorn
         logger.info(f"Starting inference server on {self.host}:{self.port}")
-        uvicorn.run(self.app, host=self.host, port=self.port)
+        # "auto" runs on uvloop when it is installed, asyncio otherwise
+        uvicorn.run(self.app, host=self.host, port=self.port, loop="auto")
 
 
 if __name__ == "__main__":
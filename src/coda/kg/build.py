@@ -1,3 +1,6 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional
+
 from tqdm import tqdm
 
 from .sources import (
@@ -23,19 +26,58 @@ EXPORTERS: list[KGSourceExporter] = [
     hpo.HpoExporter(),
 ]
 
+# These sources are built from openacme's ICD-10 graph, which is downloaded
+# and built on first use, so they are exported one after the other rather
+# than racing to create the same files
+ICD10_GRAPH_EXPORTERS = (
+    icd10.ICD10Exporter,
+    who_va.WhoVaExporter,
+    acme.ACMEExporter,
+)
+
+
+def dump_kg(max_workers: Optional[int] = None):
+    """Dump the knowledge graph to file.
+
+    The sources are independent of each other, so they are exported
+    concurrently in separate processes, except for the sources sharing
+    the ICD-10 graph, which are exported in turn by one process.
 
-def dump_kg():
-    """Dump the knowledge graph to file."""
-    # Make folder if needed
+    Parameters
+    ----------
+    max_workers :
+        Maximum number of processes exporting sources at once. Defaults to
+        one process per group of sources, as much of their time is spent
+        downloading files.
+    """
+    # Make folder if needed, before the exporters write to it
     KG_BASE.mkdir(exist_ok=True)
 
-    for exporter in tqdm(
-        EXPORTERS,
+    icd10_graph_exporters = [exporter for exporter in EXPORTERS
+                             if isinstance(exporter, ICD10_GRAPH_EXPORTERS)]
+    groups = [[exporter] for exporter in EXPORTERS
+              if exporter not in icd10_graph_exporters]
+    groups.append(icd10_graph_exporters)
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers or len(groups)
+    ) as executor, tqdm(
+        total=len(EXPORTERS),
         desc="Exporting KG sources",
         unit="source",
-    ):
-        exporter.export()
+    ) as progress:
+        futures = {executor.submit(_run_exporters, group): group
+                   for group in groups}
+        for future in as_completed(futures):
+            # Re-raise any exception of the exporters
+            future.result()
+            progress.update(len(futures[future]))
 
 
+def _run_exporters(exporters: List[KGSourceExporter]):
+    """Export sources in turn, at the module level so it can be sent to workers."""
+    for exporter in exporters:
+        exporter.export()
+
 if __name__ == "__main__":
     dump_kg()
@@ -1,15 +1,30 @@
+import os
+from functools import partial
+from multiprocessing import get_context
+
 import gilda
 import tqdm
 import pandas as pd
 
 exclude_list = ['Person', 'Death', 'Patients', 'gave', 'go', 'pm', 'PATIENT', 'bp', 'cold']
 
+# Each process works with the grounder's lookup tables, so the number of
+# processes is capped to bound the memory used on machines with many cores,
+# set GROUND_MAX_PROCESSES to change the cap
+MAX_PROCESSES = int(os.getenv('GROUND_MAX_PROCESSES', '8'))
+
 if __name__ == '__main__':
     df = pd.read_excel('../../data/ihme/PHMRC_VAI_redacted_free_text.xlsx', sheet_name='data')
+    texts = df['open_response'].dropna().tolist()
+
+    # Load the grounder before forking, so the processes share it rather
+    # than each loading its own copy
+    gilda.get_grounder()
 
-    groundings = []
-    for _, row in tqdm.tqdm(df.iterrows(), total=len(df)):
-        if pd.isna(row['open_response']):
-            continue
-        grounding = gilda.annotate(row['open_response'], namespaces=['MESH', 'DOID', 'HP'])
-        groundings.append(grounding)
+    # Annotation is CPU-bound and independent per response, so spread it over
+    # processes, in chunks to amortize the inter-process communication
+    annotate = partial(gilda.annotate, namespaces=['MESH', 'DOID', 'HP'])
+    processes = min(os.cpu_count() or 1, MAX_PROCESSES)
+    with get_context('fork').Pool(processes) as pool:
+        groundings = list(tqdm.tqdm(pool.imap(annotate, texts, chunksize=64),
+                                    total=len(texts)))
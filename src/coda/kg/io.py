@@ -1,6 +1,6 @@
 __all__ = ['networkx_to_tsv']
 
-import pandas as pd
+import csv
 
 
 def networkx_to_tsv(g, node_path, edge_path):
@@ -17,23 +17,49 @@ def networkx_to_tsv(g, node_path, edge_path):
     edge_path : str | Path
         Path to output TSV file for edges.
     """
-    # Export nodes
-    node_rows = []
-    for node, data in g.nodes(data=True):
-        if data.get('redundant'):
-            continue
-        row = {'id:ID': node, ':LABEL': data.pop('kind', 'Entity')}
-        row.update(data)
-        node_rows.append(row)
-    node_df = pd.DataFrame(node_rows)
-    node_df.to_csv(node_path, sep='\t', index=False)
+    # Export nodes. Rows are streamed from generators rather than collected,
+    # which also keeps the allocations from triggering garbage collection
+    # passes over the (large) graph
+    def nodes():
+        return ((node, data) for node, data in g.nodes(data=True)
+                if not data.get('redundant'))
+
+    keys = _attribute_keys(data for _, data in nodes())
+    node_rows = (
+        [node, data.get('kind', 'Entity'), *[data.get(key) for key in keys]]
+        for node, data in nodes()
+    )
+    _write_tsv(node_path, ['id:ID', ':LABEL', *keys], node_rows)
 
     # Export edges
-    edge_rows = []
-    for source, target, data in g.edges(data=True):
-        row = {':START_ID': source, ':END_ID': target,
-               ':TYPE': data.pop('kind', 'related_to')}
-        row.update(data)
-        edge_rows.append(row)
-    edge_df = pd.DataFrame(edge_rows)
-    edge_df.to_csv(edge_path, sep='\t', index=False)
+    keys = _attribute_keys(data for _, _, data in g.edges(data=True))
+    edge_rows = (
+        [source, target, data.get('kind', 'related_to'),
+         *[data.get(key) for key in keys]]
+        for source, target, data in g.edges(data=True)
+    )
+    _write_tsv(edge_path, [':START_ID', ':END_ID', ':TYPE', *keys], edge_rows)
+
+
+def _attribute_keys(attributes):
+    """Return the attribute keys in order of first appearance, except kind.
+
+    The kind of nodes and edges is exported as their label and type.
+    """
+    keys = {}
+    for data in attributes:
+        if not keys.keys() >= data.keys():
+            keys.update(dict.fromkeys(data))
+    keys.pop('kind', None)
+    return list(keys)
+
+
+def _write_tsv(path, header, rows):
+    """Stream rows to a TSV file without building an intermediate table.
+
+    Missing attributes (None) are written as empty fields.
+    """
+    with open(path, 'w', newline='') as fh:
+        writer = csv.writer(fh, delimiter='\t', lineterminator='\n')
+        writer.writerow(header)
+        writer.writerows(rows)
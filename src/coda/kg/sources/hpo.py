@@ -24,14 +24,16 @@ class HpoExporter(KGSourceExporter):
         # Set curies and types
         df["disease_curie"] = df["database_id"].str.lower()
         df["phenotype_curie"] = df["hpo_id"].str.lower()
-        df["disease_type"] = df["database_id"].str.split(":").str[0].str.lower()
-        df["phenotype_type"] = df["hpo_id"].str.split(":").str[0].str.lower()
+        # Types are the (already lowercased) prefixes of the curies
+        df["disease_type"] = df["disease_curie"].str.partition(":")[0]
+        df["phenotype_type"] = df["phenotype_curie"].str.partition(":")[0]
 
         # Load HPO graph to get term names
         hp_graph = obonet.read_obo(hpo_file)
-        df["hpo_name"] = df["hpo_id"].map(
-            lambda x: hp_graph.nodes[x]["name"] if x in hp_graph.nodes else None
-        )
+        # Map through a dict, which pandas looks up without calling back into
+        # Python per row. IDs that aren't in the graph get no name, as before
+        name_by_id = {node: data.get("name") for node, data in hp_graph.nodes(data=True)}
+        df["hpo_name"] = df["hpo_id"].map(name_by_id)
 
         # Dump disease and phenotype nodes
         pd.concat(
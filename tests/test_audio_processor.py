@@ -0,0 +1,70 @@
+import numpy as np
+
+from coda.dialogue import AudioProcessor
+
+
+def _to_bytes(samples):
+    return np.asarray(samples, dtype=np.int16).tobytes()
+
+
+def _assert_chunk_equal(chunk, samples):
+    """Check a normalized float32 chunk against the int16 samples sent."""
+    assert chunk.dtype == np.float32
+    np.testing.assert_array_equal(chunk * 32768, samples)
+
+
+class TestAudioProcessor:
+    """Unit tests for AudioProcessor buffering."""
+
+    def test_chunk_ready_only_after_enough_audio(self):
+        """Test that a chunk is only available once chunk_size samples arrived."""
+        processor = AudioProcessor(sample_rate=10, chunk_duration=2)
+        assert processor.chunk_size == 20
+
+        assert not processor.add_audio(_to_bytes(range(15)))
+        assert processor.get_chunk() is None
+        assert processor.add_audio(_to_bytes(range(15, 25)))
+
+        chunk_id, timestamp, chunk = processor.get_chunk()
+        assert isinstance(chunk_id, str)
+        assert isinstance(timestamp, float)
+        _assert_chunk_equal(chunk, np.arange(20))
+
+    def test_overlap_is_kept_between_chunks(self):
+        """Test that the last half second of a chunk starts the next one."""
+        processor = AudioProcessor(sample_rate=10, chunk_duration=2)
+        # Many small packets, as sent by the browser client
+        for i in range(0, 40, 4):
+            processor.add_audio(_to_bytes(range(i, i + 4)))
+
+        _, _, first = processor.get_chunk()
+        _assert_chunk_equal(first, np.arange(20))
+        # 0.5 seconds of overlap at 10 Hz is 5 samples
+        _, _, second = processor.get_chunk()
+        _assert_chunk_equal(second, np.arange(15, 35))
+        assert processor.get_chunk() is None
+
+    def test_clear_buffer(self):
+        """Test that clearing the buffer drops all pending audio."""
+        processor = AudioProcessor(sample_rate=10, chunk_duration=2)
+        processor.add_audio(_to_bytes(range(30)))
+        processor.clear_buffer()
+        assert processor.get_chunk() is None
+        assert not processor.add_audio(_to_bytes(range(10)))
+
+    def test_long_stream_and_large_packets(self):
+        """Test that chunks stay correct as the buffer is reused and grown."""
+        processor = AudioProcessor(sample_rate=10, chunk_duration=2)
+        stream = np.arange(2000)
+        expected_start = 0
+        position = 0
+        # Mix of small packets and packets larger than the buffer
+        for size in [3, 7, 50, 1, 13, 120, 9] * 5:
+            processor.add_audio(_to_bytes(stream[position:position + size]))
+            position += size
+            while (result := processor.get_chunk()) is not None:
+                _, _, chunk = result
+                _assert_chunk_equal(
+                    chunk, stream[expected_start:expected_start + 20])
+                expected_start += 15
+        assert processor.num_samples == position - expected_start
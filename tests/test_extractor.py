@@ -0,0 +1,135 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openacme")
+
+from coda.grounding.icd10_rag_grounder.icd10_rag_extraction.extractor import (
+    DiseaseExtractor,
+    _DiseaseStreamParser,
+)
+
+DESCRIPTION = (
+    'The patient said "I can\'t breathe" and had chest pain [severe], '
+    'then a fever {38.5 \u00b0C} with cough.'
+)
+
+RESPONSE_TEXT = json.dumps({
+    "Diseases": [
+        {
+            "Disease": "Dyspnea",
+            "Supporting Evidence": ['said "I can\'t breathe"'],
+            "ICD10": "R06.0",
+        },
+        {
+            "Disease": "Chest pain",
+            "Supporting Evidence": ["chest pain [severe]", "pain ]}, {"],
+            "ICD10": "R07.4",
+            "Details": {"onset": {"relative": "acute"}, "sites": ["chest"]},
+        },
+        {
+            "Disease": "Fever",
+            # Non-ASCII characters are escaped as \uXXXX in the JSON text
+            "Supporting Evidence": ["fever {38.5 \u00b0C}", "back\\slash"],
+            "ICD10": "R50.9",
+        },
+    ]
+}, indent=2)
+
+
+class FakeStream:
+    """Async iterator over the text delta events of a streamed response."""
+
+    def __init__(self, deltas):
+        self.events = [
+            SimpleNamespace(type="response.output_text.delta", delta=delta)
+            for delta in deltas
+        ]
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        yield SimpleNamespace(type="response.created")
+        for event in self.events:
+            yield event
+        yield SimpleNamespace(type="response.completed")
+
+
+def _split(text, size):
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+def _make_extractor(deltas):
+    extractor = DiseaseExtractor(api_key="test")
+
+    async def create(**kwargs):
+        assert kwargs["stream"] is True
+        return FakeStream(deltas)
+
+    extractor.clients = SimpleNamespace(
+        async_client=SimpleNamespace(responses=SimpleNamespace(create=create))
+    )
+    return extractor
+
+
+class TestDiseaseStreamParser:
+    """Unit tests for the incremental parser of streamed extractions."""
+
+    @pytest.mark.parametrize("size", [1, 2, 3, 7, 16, len(RESPONSE_TEXT)])
+    def test_chunk_splits(self, size):
+        """Test that any split of the text yields all diseases, in order."""
+        parser = _DiseaseStreamParser()
+        diseases = []
+        for delta in _split(RESPONSE_TEXT, size):
+            diseases.extend(parser.feed(delta))
+
+        assert parser.done
+        assert parser.text == RESPONSE_TEXT
+        assert diseases == json.loads(RESPONSE_TEXT)["Diseases"]
+
+    def test_disease_yielded_once_complete(self):
+        """Test that a disease is only returned once all of it arrived."""
+        first_end = RESPONSE_TEXT.index('"R06.0"') + len('"R06.0"')
+        parser = _DiseaseStreamParser()
+
+        assert parser.feed(RESPONSE_TEXT[:first_end]) == []
+        assert [d["Disease"] for d in parser.feed("\n    }")] == ["Dyspnea"]
+
+    @pytest.mark.parametrize("text", ['{"Diseases": []}', '{"Diseases":[\n]}'])
+    def test_empty_diseases(self, text):
+        """Test that an empty list yields nothing and is done."""
+        parser = _DiseaseStreamParser()
+        diseases = []
+        for delta in _split(text, 1):
+            diseases.extend(parser.feed(delta))
+
+        assert diseases == []
+        assert parser.done
+
+
+class TestStreamedExtraction:
+    """Unit tests for DiseaseExtractor.astream_diseases."""
+
+    @pytest.mark.parametrize("size", [1, 5, len(RESPONSE_TEXT)])
+    async def test_matches_parse_response(self, size):
+        """Test that streaming yields the diseases of the full response."""
+        extractor = _make_extractor(_split(RESPONSE_TEXT, size))
+        streamed = [disease async for disease
+                    in extractor.astream_diseases(DESCRIPTION)]
+        parsed = extractor._parse_response(RESPONSE_TEXT, DESCRIPTION)
+
+        assert streamed == parsed["Diseases"]
+        assert [d["Disease"] for d in streamed] == ["Dyspnea", "Chest pain",
+                                                    "Fever"]
+
+    async def test_empty_diseases(self):
+        """Test that an empty response yields no diseases."""
+        text = '{"Diseases": []}'
+        extractor = _make_extractor(_split(text, 3))
+        streamed = [disease async for disease
+                    in extractor.astream_diseases(DESCRIPTION)]
+
+        assert streamed == extractor._parse_response(text, DESCRIPTION)["Diseases"]
+        assert streamed == []
@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("openacme")
+
+from coda.grounding.icd10_rag_grounder.icd10_rag_extraction.utils import (
+    ICD10_CODE_MAX_LENGTH,
+    validate_icd10_code,
+)
+
+
+@pytest.mark.parametrize("code", ["A00", "I50.9", "B20.1", "A18.61", "O36.5931"])
+def test_valid_codes(code):
+    """Test that well-formed codes, up to the maximum length, are valid."""
+    assert len(code) <= ICD10_CODE_MAX_LENGTH
+    assert validate_icd10_code(code)
+
+
+@pytest.mark.parametrize("code", [
+    "",
+    "A0",  # Too short
+    "A00.",  # Dot without digits
+    "A00.12345",  # One digit longer than the maximum length
+    "S52.521A",  # Alphanumeric characters after the dot aren't accepted
+    "a00",
+    "A00 ",
+    "Acute myocardial infarction",
+    None,
+])
+def test_invalid_codes(code):
+    """Test that malformed codes are invalid."""
+    assert not validate_icd10_code(code)
@@ -0,0 +1,70 @@
+import copy
+
+import networkx as nx
+import pandas as pd
+
+from coda.kg.io import networkx_to_tsv
+
+
+def _graph():
+    g = nx.DiGraph()
+    g.add_node("icd10:A00", kind="icd10", name="Cholera", code="A00")
+    g.add_node("icd10:A01", name="Typhoid\tfever", level=2)
+    g.add_node("icd10:A02", kind="icd10", redundant=True)
+    g.add_node("hp:0001945", kind="hp", name='Fever "pyrexia"')
+    g.add_edge("icd10:A00", "icd10:A01", kind="is_a", weight=0.5)
+    g.add_edge("icd10:A01", "hp:0001945")
+    g.add_edge("hp:0001945", "icd10:A00", kind="related_to", source="hpo")
+    return g
+
+
+def _read(path):
+    return pd.read_csv(path, sep="\t", dtype=str, keep_default_na=False)
+
+
+def test_networkx_to_tsv(tmp_path):
+    """Test that nodes and edges round-trip through the TSV files."""
+    g = _graph()
+    original = copy.deepcopy(g)
+    node_path, edge_path = tmp_path / "nodes.tsv", tmp_path / "edges.tsv"
+    networkx_to_tsv(g, node_path, edge_path)
+
+    nodes = _read(node_path)
+    # Attribute columns of the exported nodes follow in order of first
+    # appearance, without kind
+    assert list(nodes.columns) == ["id:ID", ":LABEL", "name", "code", "level"]
+    # Redundant nodes are left out, missing attributes are empty
+    assert nodes.to_dict("records") == [
+        {"id:ID": "icd10:A00", ":LABEL": "icd10", "name": "Cholera",
+         "code": "A00", "level": ""},
+        {"id:ID": "icd10:A01", ":LABEL": "Entity", "name": "Typhoid\tfever",
+         "code": "", "level": "2"},
+        {"id:ID": "hp:0001945", ":LABEL": "hp", "name": 'Fever "pyrexia"',
+         "code": "", "level": ""},
+    ]
+
+    edges = _read(edge_path)
+    assert list(edges.columns) == [":START_ID", ":END_ID", ":TYPE", "weight",
+                                   "source"]
+    assert edges.to_dict("records") == [
+        {":START_ID": "icd10:A00", ":END_ID": "icd10:A01", ":TYPE": "is_a",
+         "weight": "0.5", "source": ""},
+        {":START_ID": "icd10:A01", ":END_ID": "hp:0001945",
+         ":TYPE": "related_to", "weight": "", "source": ""},
+        {":START_ID": "hp:0001945", ":END_ID": "icd10:A00",
+         ":TYPE": "related_to", "weight": "", "source": "hpo"},
+    ]
+
+    # The graph isn't modified by the export
+    assert dict(g.nodes(data=True)) == dict(original.nodes(data=True))
+    assert list(g.edges(data=True)) == list(original.edges(data=True))
+
+
+def test_networkx_to_tsv_without_attributes(tmp_path):
+    """Test a graph whose nodes and edges have no attributes."""
+    g = nx.Graph([("a", "b")])
+    node_path, edge_path = tmp_path / "nodes.tsv", tmp_path / "edges.tsv"
+    networkx_to_tsv(g, node_path, edge_path)
+
+    assert node_path.read_text() == "id:ID\t:LABEL\na\tEntity\nb\tEntity\n"
+    assert edge_path.read_text() == ":START_ID\t:END_ID\t:TYPE\na\tb\trelated_to\n"
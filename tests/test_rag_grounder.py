@@ -0,0 +1,120 @@
+import pytest
+
+pytest.importorskip("openacme")
+
+from coda.grounding.icd10_rag_grounder import icd10_rag_grounder
+from coda.grounding.icd10_rag_grounder.icd10_rag_grounder import RAGGrounder
+
+
+class FakePipeline:
+    """Stand-in for MedCoderPipeline recording the texts it processes."""
+
+    def __init__(self, **kwargs):
+        self.processed = []
+        # Texts whose extraction or re-ranking requests fail
+        self.failed_extraction = set()
+        self.failed_reranking = set()
+
+    def process(self, texts, annotate_evidence=True,
+                annotation_min_similarity=0.7):
+        self.processed.extend(texts)
+        return [self._result(text) for text in texts]
+
+    def _result(self, text):
+        if text in self.failed_extraction:
+            return {"Diseases": [], "error": "Request timed out."}
+        disease = {
+            "Disease": text,
+            "reranked_codes": [{
+                "ICD-10 Code": "A09",
+                "ICD-10 Name": "Infectious gastroenteritis",
+                "similarity": 0.9,
+            }],
+            "evidence_spans": [
+                {"text": text, "start": 0, "end": len(text)}
+            ],
+        }
+        if text in self.failed_reranking:
+            disease.update(reranked_codes=[], error="Rate limit reached.")
+        return {"Diseases": [disease]}
+
+
+@pytest.fixture
+def make_grounder(monkeypatch):
+    """Fixture creating RAGGrounders on a fake pipeline."""
+    monkeypatch.setattr(icd10_rag_grounder, "MedCoderPipeline", FakePipeline)
+
+    def make(**kwargs):
+        return RAGGrounder(openai_api_key="test", **kwargs)
+
+    return make
+
+
+class TestRAGGrounderCache:
+    """Unit tests for the result cache of RAGGrounder."""
+
+    def test_cache_hit(self, make_grounder):
+        """Test that repeated texts are only processed once."""
+        grounder = make_grounder()
+        first = grounder.ground("diarrhea")
+        second = grounder.ground("diarrhea")
+
+        assert grounder.pipeline.processed == ["diarrhea"]
+        assert [m.term.id for m in first] == ["A09"]
+        assert [m.term.id for m in second] == ["A09"]
+        # Callers get copies of the cached results
+        assert first is not second
+
+    def test_ground_and_annotate_cached_separately(self, make_grounder):
+        """Test that grounding results aren't returned as annotations."""
+        grounder = make_grounder()
+        grounder.ground("diarrhea")
+        annotations = grounder.annotate("diarrhea")
+
+        assert grounder.pipeline.processed == ["diarrhea", "diarrhea"]
+        assert [a.text for a in annotations] == ["diarrhea"]
+
+    def test_batch_processes_uncached_texts_once(self, make_grounder):
+        """Test that batches only process new, distinct texts."""
+        grounder = make_grounder()
+        grounder.ground("fever")
+        results = grounder.ground_batch(["fever", "rash", "rash"])
+
+        assert grounder.pipeline.processed == ["fever", "rash"]
+        assert [len(matches) for matches in results] == [1, 1, 1]
+
+    def test_eviction(self, make_grounder):
+        """Test that the least recently used texts are evicted."""
+        grounder = make_grounder(cache_size=2)
+        grounder.ground("fever")
+        grounder.ground("rash")
+        grounder.ground("fever")  # fever is now the most recently used
+        grounder.ground("cough")  # evicts rash
+        grounder.ground("fever")
+        grounder.ground("rash")
+
+        assert grounder.pipeline.processed == ["fever", "rash", "cough", "rash"]
+
+    def test_cache_disabled(self, make_grounder):
+        """Test that a cache size of 0 processes every call."""
+        grounder = make_grounder(cache_size=0)
+        grounder.ground("fever")
+        grounder.ground("fever")
+
+        assert grounder.pipeline.processed == ["fever", "fever"]
+
+    @pytest.mark.parametrize("failure", ["failed_extraction", "failed_reranking"])
+    def test_failures_not_cached(self, make_grounder, failure):
+        """Test that results of failed requests are processed again."""
+        grounder = make_grounder()
+        getattr(grounder.pipeline, failure).add("fever")
+
+        assert grounder.ground_batch(["fever", "rash"]) == [
+            [], grounder.ground("rash")
+        ]
+        getattr(grounder.pipeline, failure).clear()
+        # Once the requests succeed, the result is cached
+        assert [m.term.id for m in grounder.ground("fever")] == ["A09"]
+        grounder.ground("fever")
+
+        assert grounder.pipeline.processed == ["fever", "rash", "fever"]
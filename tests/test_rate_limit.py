@@ -0,0 +1,124 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openacme")
+
+from coda.grounding.icd10_rag_grounder.icd10_rag_extraction import rate_limit
+from coda.grounding.icd10_rag_grounder.icd10_rag_extraction.rate_limit import RateLimiter
+
+
+class FakeClock:
+    """Clock that only advances when slept on, recording the sleeps."""
+
+    def __init__(self, advance=True):
+        self.now = 100.0
+        self.advance = advance
+        self.sleeps = []
+        self._lock = threading.Lock()
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, delay):
+        with self._lock:
+            self.sleeps.append(delay)
+            if self.advance:
+                self.now += delay
+
+    async def async_sleep(self, delay):
+        self.sleep(delay)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fixture replacing the clock and sleeps used by the rate limiter."""
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    monkeypatch.setattr(rate_limit, "asyncio",
+                        SimpleNamespace(sleep=clock.async_sleep))
+    return clock
+
+
+def test_invalid_arguments():
+    """Test that non-positive rates and bursts are rejected."""
+    with pytest.raises(ValueError):
+        RateLimiter(0)
+    with pytest.raises(ValueError):
+        RateLimiter(60, burst=0)
+
+
+def test_spacing(clock):
+    """Test that requests are spaced evenly at the rate."""
+    limiter = RateLimiter(requests_per_minute=120)
+    for _ in range(4):
+        limiter.wait()
+
+    # The first request is sent at once, the next ones every 0.5s
+    assert clock.sleeps == [0.5, 0.5, 0.5]
+    assert clock.now == pytest.approx(101.5)
+
+
+def test_idle_time_not_accumulated(clock):
+    """Test that idle time doesn't allow more than a burst afterwards."""
+    limiter = RateLimiter(requests_per_minute=60)
+    limiter.wait()
+    clock.now += 10
+    limiter.wait()
+    limiter.wait()
+
+    assert clock.sleeps == [1.0]
+
+
+def test_burst(clock):
+    """Test that up to burst requests are sent at once after idling."""
+    limiter = RateLimiter(requests_per_minute=60, burst=3)
+    for _ in range(5):
+        limiter.wait()
+
+    # Three requests at once, then one per second
+    assert clock.sleeps == [1.0, 1.0]
+    assert clock.now == pytest.approx(102.0)
+
+    clock.now += 10
+    clock.sleeps.clear()
+    for _ in range(3):
+        limiter.wait()
+    assert clock.sleeps == []
+
+
+def test_async_acquire_shares_rate_across_loops(clock):
+    """Test that acquire spaces requests, also across event loops."""
+    limiter = RateLimiter(requests_per_minute=60)
+
+    async def acquire(n):
+        for _ in range(n):
+            await limiter.acquire()
+
+    asyncio.run(acquire(2))
+    asyncio.run(acquire(2))
+
+    assert clock.sleeps == [1.0, 1.0, 1.0]
+
+
+def test_threads_get_distinct_slots(monkeypatch):
+    """Test that concurrent threads each reserve their own slot."""
+    # The clock doesn't advance, so each request waits for its slot
+    clock = FakeClock(advance=False)
+    monkeypatch.setattr(rate_limit, "time", clock)
+    limiter = RateLimiter(requests_per_minute=60)
+
+    def send(n):
+        for _ in range(n):
+            limiter.wait()
+
+    threads = [threading.Thread(target=send, args=(25,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The first request doesn't wait, the others wait 1s per earlier request
+    assert sorted(clock.sleeps) == [float(i) for i in range(1, 100)]
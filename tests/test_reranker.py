@@ -0,0 +1,146 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openacme")
+
+from coda.grounding.icd10_rag_grounder.icd10_rag_extraction.reranker import CodeReranker
+
+
+class FakeResponses:
+    """Stand-in for client.responses returning a fixed output text."""
+
+    def __init__(self, output_text):
+        self.output_text = output_text
+        self.requests = []
+
+    def create(self, **request):
+        self.requests.append(request)
+        if isinstance(self.output_text, Exception):
+            raise self.output_text
+        return SimpleNamespace(output_text=self.output_text)
+
+
+class FakeAsyncResponses(FakeResponses):
+    async def create(self, **request):
+        return super().create(**request)
+
+
+def _candidate(disease, codes):
+    return dict(
+        disease=disease,
+        evidence=[disease.lower()],
+        llm_code=codes[0] if codes else "",
+        llm_code_name="",
+        retrieved_codes=[
+            {"code": code, "name": f"Name of {code}", "similarity": 0.8 - 0.1 * idx}
+            for idx, code in enumerate(codes)
+        ],
+    )
+
+
+def _ranking(*codes):
+    return {
+        "Reranked ICD-10 Codes": [
+            {"ICD-10 Code": code, "ICD-10 Name": f"Name of {code}"}
+            for code in codes
+        ]
+    }
+
+
+def _rerank_many(candidates, output, use_async):
+    """Run rerank_many or arerank_many with a stubbed responses.create."""
+    output_text = (output if isinstance(output, (str, Exception))
+                   else json.dumps(output))
+    reranker = CodeReranker(api_key="test")
+    if use_async:
+        responses = FakeAsyncResponses(output_text)
+        reranker.clients = SimpleNamespace(
+            async_client=SimpleNamespace(responses=responses)
+        )
+        results = asyncio.run(reranker.arerank_many(candidates))
+    else:
+        responses = FakeResponses(output_text)
+        reranker.client = SimpleNamespace(responses=responses)
+        results = reranker.rerank_many(candidates)
+    return results, responses.requests
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+class TestJointReranking:
+    """Unit tests for re-ranking several diseases in one request."""
+
+    def test_results_in_candidate_order(self, use_async):
+        """Test that each candidate gets its result, with similarities."""
+        candidates = [_candidate("Fever", ["R50.9", "R50.8"]),
+                      _candidate("Cough", ["R05", "J20.9"])]
+        output = {"Results": [_ranking("R50.8", "R50.9"), _ranking("R05")]}
+        results, requests = _rerank_many(candidates, output, use_async)
+
+        assert len(requests) == 1
+        assert requests[0]["text"]["format"]["name"] == "reranking_icd_10_codes_many"
+        codes = [[(c["ICD-10 Code"], c["similarity"])
+                  for c in result["Reranked ICD-10 Codes"]]
+                 for result in results]
+        assert codes == [[("R50.8", pytest.approx(0.7)), ("R50.9", 0.8)],
+                         [("R05", 0.8)]]
+
+    def test_invalid_codes_dropped(self, use_async):
+        """Test that malformed codes of a result are left out."""
+        candidates = [_candidate("Fever", ["R50.9"])]
+        output = {"Results": [_ranking("fever", "R50.9")]}
+        results, _ = _rerank_many(candidates, output, use_async)
+
+        assert [c["ICD-10 Code"] for c in results[0]["Reranked ICD-10 Codes"]] == ["R50.9"]
+
+    def test_wrong_number_of_results(self, use_async):
+        """Test that a result count not matching the candidates gives empty results."""
+        candidates = [_candidate("Fever", ["R50.9"]),
+                      _candidate("Cough", ["R05"])]
+        output = {"Results": [_ranking("R50.9")]}
+        results, _ = _rerank_many(candidates, output, use_async)
+
+        assert results == [{"Reranked ICD-10 Codes": []}] * 2
+
+    def test_invalid_json(self, use_async):
+        """Test that an unparsable response gives empty results."""
+        candidates = [_candidate("Fever", ["R50.9"])]
+        results, _ = _rerank_many(candidates, '{"Results": [', use_async)
+
+        assert results == [{"Reranked ICD-10 Codes": []}]
+
+    def test_failed_request(self, use_async):
+        """Test that a failed request gives empty results with the error."""
+        candidates = [_candidate("Unknown", []), _candidate("Fever", ["R50.9"])]
+        results, _ = _rerank_many(candidates, TimeoutError("Request timed out."),
+                                  use_async)
+
+        assert results == [
+            {"Reranked ICD-10 Codes": []},
+            {"Reranked ICD-10 Codes": [], "error": "Request timed out."},
+        ]
+
+    def test_candidates_without_codes_left_out(self, use_async):
+        """Test that diseases without retrieved codes aren't sent."""
+        candidates = [_candidate("Unknown", []),
+                      _candidate("Cough", ["R05"]),
+                      _candidate("Other", [])]
+        output = {"Results": [_ranking("R05")]}
+        results, requests = _rerank_many(candidates, output, use_async)
+
+        user_prompt = requests[0]["input"][1]["content"]
+        assert "Cough" in user_prompt
+        assert "Unknown" not in user_prompt and "Other" not in user_prompt
+        assert "Disease 2" not in user_prompt
+        assert results[0] == results[2] == {"Reranked ICD-10 Codes": []}
+        assert [c["ICD-10 Code"] for c in results[1]["Reranked ICD-10 Codes"]] == ["R05"]
+
+    def test_no_request_without_codes(self, use_async):
+        """Test that no request is sent if no disease has codes."""
+        candidates = [_candidate("Unknown", [])]
+        results, requests = _rerank_many(candidates, {"Results": []}, use_async)
+
+        assert requests == []
+        assert results == [{"Reranked ICD-10 Codes": []}]
@@ -0,0 +1,128 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openacme")
+
+from coda.grounding.icd10_rag_grounder.icd10_rag_extraction.cache import (
+    MemoryResponseCache,
+    ResponseCache,
+    _request_key,
+)
+from coda.grounding.icd10_rag_grounder.icd10_rag_extraction.extractor import DiseaseExtractor
+
+
+def _request(user_prompt="Fever and cough", model="gpt-4o-mini"):
+    return dict(
+        model=model,
+        input=[
+            {"role": "system", "content": "Extract diseases."},
+            {"role": "user", "content": user_prompt},
+        ],
+        text={"format": {"type": "json_schema", "name": "disease_evidence_icd10",
+                         "schema": {"type": "object"}, "strict": True}},
+    )
+
+
+@pytest.fixture(params=["memory", "disk"])
+def cache(request, tmp_path):
+    """Fixture for an in-memory and an on-disk response cache."""
+    if request.param == "memory":
+        return MemoryResponseCache()
+    pytest.importorskip("diskcache")
+    return ResponseCache(tmp_path / "llm_cache")
+
+
+class TestRequestKey:
+    """Unit tests for the cache keys of requests."""
+
+    def test_stable(self):
+        """Test that keys don't depend on dict order or identity."""
+        request = _request()
+        reordered = dict(reversed(list(_request().items())))
+
+        assert _request_key(request) == _request_key(reordered)
+        # A fixed value guards against keys changing between versions,
+        # which would silently invalidate persisted caches
+        assert _request_key({"model": "m"}) == (
+            "deea0f7771b9f0a56298d0fdc590f8b0c7ce655b94bfd162763a86afdd1b4a4f"
+        )
+
+    @pytest.mark.parametrize("changed", [
+        _request(user_prompt="Fever"),
+        _request(model="gpt-4o"),
+    ])
+    def test_changes_with_request(self, changed):
+        """Test that changing any part of the request changes the key."""
+        assert _request_key(changed) != _request_key(_request())
+
+    def test_changes_with_schema(self):
+        """Test that a different output schema changes the key."""
+        changed = _request()
+        changed["text"]["format"]["schema"] = {"type": "array"}
+
+        assert _request_key(changed) != _request_key(_request())
+
+
+class TestResponseCaches:
+    """Unit tests shared by the in-memory and on-disk response caches."""
+
+    def test_get_set(self, cache):
+        """Test that stored responses are returned for equal requests."""
+        assert cache.get(_request()) is None
+        cache.set(_request(), "response")
+
+        assert cache.get(_request()) == "response"
+        assert cache.get(_request(user_prompt="Rash")) is None
+
+    def test_clear(self, cache):
+        """Test that clear removes all responses."""
+        cache.set(_request(), "response")
+        cache.clear()
+
+        assert cache.get(_request()) is None
+
+
+def test_memory_cache_lru_eviction():
+    """Test that the least recently used responses are evicted."""
+    cache = MemoryResponseCache(maxsize=2)
+    first, second, third = (_request(user_prompt=p) for p in ["a", "b", "c"])
+    cache.set(first, "1")
+    cache.set(second, "2")
+    cache.get(first)  # first is now the most recently used
+    cache.set(third, "3")  # evicts second
+
+    assert cache.get(first) == "1"
+    assert cache.get(second) is None
+    assert cache.get(third) == "3"
+
+
+def test_disk_cache_persists(tmp_path):
+    """Test that on-disk responses are shared by cache instances."""
+    pytest.importorskip("diskcache")
+    ResponseCache(tmp_path / "llm_cache").set(_request(), "response")
+
+    assert ResponseCache(tmp_path / "llm_cache").get(_request()) == "response"
+
+
+def test_cache_hit_skips_api_call(cache):
+    """Test that a cached extraction doesn't call the API again."""
+    output_text = json.dumps({"Diseases": [{
+        "Disease": "Fever", "Supporting Evidence": ["fever"], "ICD10": "R50.9"
+    }]})
+    requests = []
+
+    def create(**request):
+        requests.append(request)
+        return SimpleNamespace(output_text=output_text)
+
+    extractor = DiseaseExtractor(api_key="test", cache=cache)
+    extractor.client = SimpleNamespace(responses=SimpleNamespace(create=create))
+    first = extractor.extract("Patient has fever.")
+    second = extractor.extract("Patient has fever.")
+    extractor.extract("Patient has a rash.")
+
+    assert len(requests) == 2
+    assert first == second
+    assert [d["ICD10"] for d in second["Diseases"]] == ["R50.9"]
@@ -0,0 +1,153 @@
+import zlib
+
+import numpy as np
+import pytest
+
+pytest.importorskip("openacme")
+
+from coda.grounding.icd10_rag_grounder.icd10_rag_extraction import retriever
+from coda.grounding.icd10_rag_grounder.icd10_rag_extraction.retriever import (
+    ICD10Retriever,
+    _top_k_indices,
+)
+
+NUM_CODES = 500
+DIMENSION = 32
+CODES = [f"A{idx // 10:02d}.{idx % 10}" for idx in range(NUM_CODES)]
+TEXTS = ["fever and cough", "chest pain", "", "   ", "diarrhea", "fever and cough"]
+
+
+class FakeSentenceTransformer:
+    """Stand-in for SentenceTransformer with deterministic random embeddings."""
+
+    def __init__(self, model_name, **kwargs):
+        pass
+
+    def encode(self, texts, normalize_embeddings=False, **kwargs):
+        embeddings = np.stack([
+            np.random.default_rng(zlib.crc32(text.encode())).standard_normal(DIMENSION)
+            for text in texts
+        ]).astype(np.float32)
+        if normalize_embeddings:
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings
+
+
+@pytest.fixture
+def make_retriever(monkeypatch, tmp_path):
+    """Fixture creating retrievers over small random code embeddings."""
+    embeddings = np.random.default_rng(0).standard_normal(
+        (NUM_CODES, DIMENSION)).astype(np.float32)
+    definitions = {code: {"name": f"Name of {code}",
+                          "definition": f"Definition of {code}"}
+                   for code in CODES}
+    monkeypatch.setattr(retriever, "load_embeddings",
+                        lambda: (embeddings.copy(), dict(definitions)))
+    monkeypatch.setattr(retriever, "get_code_index",
+                        lambda definitions: {"idx_to_code": CODES})
+    monkeypatch.setattr(retriever, "SentenceTransformer", FakeSentenceTransformer)
+    monkeypatch.setattr(retriever.INDEX_BASE, "base", tmp_path)
+    return ICD10Retriever
+
+
+def _codes(results):
+    return [result["code"] for result in results]
+
+
+def test_retrieve_batch_matches_retrieve(make_retriever):
+    """Test that retrieve_batch gives the results of retrieve for each text."""
+    r = make_retriever()
+    batch_results = r.retrieve_batch(TEXTS, top_k=10)
+
+    assert len(batch_results) == len(TEXTS)
+    for text, batch_result in zip(TEXTS, batch_results):
+        single_result = r.retrieve(text, top_k=10)
+        assert _codes(batch_result) == _codes(single_result)
+        assert [res["similarity"] for res in batch_result] == pytest.approx(
+            [res["similarity"] for res in single_result], abs=1e-5)
+
+
+def test_results(make_retriever):
+    """Test the content and order of retrieval results."""
+    r = make_retriever()
+    results = r.retrieve("chest pain", top_k=5)
+
+    similarities = [res["similarity"] for res in results]
+    assert len(results) == 5
+    assert similarities == sorted(similarities, reverse=True)
+    assert results[0]["name"] == f"Name of {results[0]['code']}"
+    assert "definition" not in results[0]
+    assert r.retrieve("chest pain", top_k=5, include_definition=True)[0][
+        "definition"] == f"Definition of {results[0]['code']}"
+
+
+def test_empty_texts(make_retriever):
+    """Test that empty texts give no results."""
+    r = make_retriever()
+
+    assert r.retrieve("") == []
+    assert r.retrieve("  ") == []
+    assert r.retrieve_batch([]) == []
+    assert r.retrieve_batch(["", " "]) == [[], []]
+
+
+def test_top_k_zero(make_retriever):
+    """Test that top_k=0 returns nothing."""
+    r = make_retriever()
+
+    assert r.retrieve("chest pain", top_k=0) == []
+    assert r.retrieve_batch(["chest pain", "fever"], top_k=0) == [[], []]
+
+
+def test_min_similarity(make_retriever):
+    """Test that codes below min_similarity are left out."""
+    r = make_retriever()
+    results = r.retrieve("chest pain", top_k=NUM_CODES, min_similarity=0.2)
+
+    assert results
+    assert len(results) < NUM_CODES
+    assert all(res["similarity"] >= 0.2 for res in results)
+
+
+def test_float16_matches_float32(make_retriever):
+    """Test that float16 embeddings give the same top-k as float32."""
+    texts = [f"symptom {idx}" for idx in range(20)]
+    full = make_retriever().retrieve_batch(texts, top_k=10)
+    half = make_retriever(precision="float16").retrieve_batch(texts, top_k=10)
+
+    for full_result, half_result in zip(full, half):
+        assert set(_codes(half_result)) == set(_codes(full_result))
+        assert [res["similarity"] for res in half_result] == pytest.approx(
+            [res["similarity"] for res in full_result], abs=1e-2)
+
+
+def test_int8_overlaps_float32(make_retriever):
+    """Test that int8 embeddings give nearly the same top-k as float32."""
+    texts = [f"symptom {idx}" for idx in range(20)]
+    full = make_retriever().retrieve_batch(texts, top_k=10)
+    quantized = make_retriever(precision="int8").retrieve_batch(texts, top_k=10)
+
+    overlap = np.mean([
+        len(set(_codes(a)) & set(_codes(b))) / 10
+        for a, b in zip(full, quantized)
+    ])
+    assert overlap >= 0.9
+
+
+@pytest.mark.parametrize("precision", ["float32", "float16", "int8"])
+def test_mmap_matches_in_memory(make_retriever, precision):
+    """Test that memory-mapped embeddings give the same results."""
+    in_memory = make_retriever(precision=precision)
+    mapped = make_retriever(precision=precision, mmap=True)
+
+    assert isinstance(mapped.embeddings, np.memmap)
+    assert mapped.retrieve_batch(TEXTS) == in_memory.retrieve_batch(TEXTS)
+
+
+@pytest.mark.parametrize("top_k", [0, 1, 5, 50, 100])
+def test_top_k_indices(top_k):
+    """Test that _top_k_indices matches a full sort of each row."""
+    similarities = np.random.default_rng(1).standard_normal((4, 50))
+    expected = np.argsort(-similarities, axis=1)[:, :top_k]
+
+    np.testing.assert_array_equal(_top_k_indices(similarities, top_k), expected)